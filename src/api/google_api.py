@@ -10,14 +10,75 @@
 
 import os
 import json
-from typing import Dict, Any, Optional, List, Union
-from datetime import datetime, timedelta
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple, Union
+from datetime import datetime, timezone
 from urllib.parse import quote, urlencode
 
 import httpx
+import orjson
 from loguru import logger
 
 
+class _RateLimiter:
+    """
+    Простейший ограничитель частоты запросов (скользящее окно)
+
+    People API ограничивает чтения (по умолчанию 90 запросов в минуту на
+    пользователя); дешевле подождать перед запросом, чем ловить 429 и
+    раскручивать повторные попытки
+    """
+
+    def __init__(self, max_calls: int, period: float):
+        """
+        Args:
+            max_calls: Максимум запросов за окно
+            period: Длительность окна в секундах
+        """
+        self.max_calls = max_calls
+        self.period = period
+        self._timestamps: deque = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Ждет, пока запрос можно выполнить, не превышая лимит"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                # Убираем запросы, вышедшие за пределы окна
+                while self._timestamps and now - self._timestamps[0] >= self.period:
+                    self._timestamps.popleft()
+
+                if len(self._timestamps) < self.max_calls:
+                    self._timestamps.append(now)
+                    return
+
+                # Спим до освобождения самого старого слота
+                await asyncio.sleep(self.period - (now - self._timestamps[0]))
+
+
+def _pick_primary(items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Выбирает основной элемент (metadata.primary) из списка за один проход
+
+    Args:
+        items: Список элементов поля контакта из Google API
+
+    Returns:
+        Первый элемент с metadata.primary=True, иначе первый элемент списка,
+        либо None для пустого списка
+    """
+    if not items:
+        return None
+    for item in items:
+        metadata = item.get("metadata")
+        if metadata is not None and metadata.get("primary"):
+            return item
+    return items[0]
+
+
 class GoogleContactsAPI:
     """Класс для работы с Google Contacts API через REST API"""
     
@@ -37,15 +98,46 @@ class GoogleContactsAPI:
         self.auth_url = "https://accounts.google.com/o/oauth2/auth"
         self.token_url = "https://oauth2.googleapis.com/token"
         self.contacts_url = "https://people.googleapis.com/v1/people/me/connections"
-        
-    def get_auth_url(self) -> str:
-        """
-        Формирует URL для авторизации пользователя в Google
-        
-        Returns:
-            URL для авторизации
-        """
-        params = {
+
+        # Общий HTTP-клиент с пулом соединений: все запросы идут к одним и тем же
+        # хостам Google, поэтому переиспользование соединений избавляет от
+        # TCP/TLS-рукопожатия на каждый вызов, а HTTP/2 мультиплексирует
+        # параллельные запросы в одном соединении
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=30.0
+        )
+
+        # Защита от параллельных обновлений одного и того же refresh token:
+        # блокировка на каждый токен + кэш результатов недавних обновлений
+        self._refresh_locks: Dict[str, asyncio.Lock] = {}
+        self._refreshed_tokens: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+        # Запрашиваем только используемые листовые поля: полная маска
+        # (names,emailAddresses,...) возвращает metadata.sources, formattedType
+        # и прочие неиспользуемые данные, раздувая ответ в несколько раз
+        self._person_fields = ",".join((
+            "names.displayName",
+            "names.metadata.primary",
+            "emailAddresses.value",
+            "emailAddresses.metadata.primary",
+            "phoneNumbers.value",
+            "phoneNumbers.metadata.primary",
+            "organizations.name",
+            "organizations.title",
+            "organizations.metadata.primary",
+            "biographies.value",
+            "biographies.metadata.primary",
+            "urls.type",
+            "urls.value",
+        ))
+
+        # Ограничитель чтений People API (квота по умолчанию — 90 в минуту)
+        self._contacts_limiter = _RateLimiter(max_calls=90, period=60.0)
+
+        # URL авторизации зависит только от конфигурации, собираем его один раз
+        auth_params = {
             "client_id": self.client_id,
             "redirect_uri": self.redirect_uri,
             "response_type": "code",
@@ -53,10 +145,28 @@ class GoogleContactsAPI:
             "prompt": "consent",
             "scope": " ".join(self.scopes)
         }
-        
-        auth_url = f"{self.auth_url}?{urlencode(params)}"
-        return auth_url
-        
+        self._auth_url = f"{self.auth_url}?{urlencode(auth_params)}"
+
+        # Неизменяемая часть параметров запроса контактов, собирается один раз
+        self._contacts_params_base = {
+            "personFields": self._person_fields,
+            "pageSize": 100  # Максимальный размер страницы
+        }
+
+    async def aclose(self) -> None:
+        """Закрывает HTTP-клиент и освобождает соединения"""
+        await self._client.aclose()
+
+    def get_auth_url(self) -> str:
+        """
+        Возвращает URL для авторизации пользователя в Google
+
+        Returns:
+            URL для авторизации (вычислен один раз при инициализации)
+        """
+        return self._auth_url
+
+
     async def get_tokens_from_code(self, auth_code: str) -> Dict[str, Any]:
         """
         Обменивает код авторизации на токены доступа
@@ -79,21 +189,21 @@ class GoogleContactsAPI:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.token_url, data=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Вычисляем время истечения токена
-                expires_in = data.get("expires_in", 3600)  # По умолчанию 1 час
-                expiry = datetime.utcnow() + timedelta(seconds=expires_in)
-                
-                return {
-                    "access_token": data["access_token"],
-                    "refresh_token": data.get("refresh_token", ""),  # Может отсутствовать, если пользователь уже авторизован
-                    "expiry": expiry
-                }
-        
+            response = await self._client.post(self.token_url, data=params)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+
+            # Время истечения токена считаем в целых unix-секундах:
+            # без микросекунд по построению и без промежуточного timedelta
+            expires_in = data.get("expires_in", 3600)  # По умолчанию 1 час
+            expiry = datetime.fromtimestamp(int(time.time()) + expires_in, tz=timezone.utc)
+
+            return {
+                "access_token": data["access_token"],
+                "refresh_token": data.get("refresh_token", ""),  # Может отсутствовать, если пользователь уже авторизован
+                "expiry": expiry
+            }
+
         except Exception as e:
             logger.error(f"Ошибка при получении токенов Google: {e}")
             raise Exception(f"Не удалось получить токены доступа: {e}")
@@ -119,142 +229,206 @@ class GoogleContactsAPI:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.token_url, data=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Вычисляем время истечения токена
-                expires_in = data.get("expires_in", 3600)  # По умолчанию 1 час
-                expiry = datetime.utcnow() + timedelta(seconds=expires_in)
-                
-                return {
-                    "access_token": data["access_token"],
-                    "expiry": expiry
-                }
-                
+            response = await self._client.post(self.token_url, data=params)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+
+            # Время истечения токена считаем в целых unix-секундах:
+            # без микросекунд по построению и без промежуточного timedelta
+            expires_in = data.get("expires_in", 3600)  # По умолчанию 1 час
+            expiry = datetime.fromtimestamp(int(time.time()) + expires_in, tz=timezone.utc)
+
+            return {
+                "access_token": data["access_token"],
+                "expiry": expiry
+            }
+
         except Exception as e:
             logger.error(f"Ошибка при обновлении токена Google: {e}")
             raise Exception(f"Не удалось обновить токен доступа: {e}")
-    
-    async def get_contacts(self, access_token: str, refresh_token: Optional[str] = None) -> List[Dict[str, Any]]:
+
+    async def _get_valid_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """
-        Получает список контактов пользователя из Google Contacts
-        
+        Возвращает действующий токен доступа, обновляя его при необходимости
+
+        Параллельные корутины с одним refresh token не делают лишних запросов
+        к endpoint'у обновления: первая обновляет токен под блокировкой,
+        остальные получают результат из кэша (double-checked locking)
+
+        Args:
+            refresh_token: Токен обновления
+
+        Returns:
+            Словарь с токеном доступа и сроком его действия
+        """
+        # Быстрый путь: проверяем кэш без блокировки. Сравниваем monotonic-метки:
+        # это дешевле, чем конструировать и сравнивать объекты datetime
+        cached = self._refreshed_tokens.get(refresh_token)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        lock = self._refresh_locks.setdefault(refresh_token, asyncio.Lock())
+        async with lock:
+            # Перепроверяем кэш: токен мог обновить другой запрос, пока мы ждали
+            cached = self._refreshed_tokens.get(refresh_token)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+            tokens = await self.refresh_access_token(refresh_token)
+            # Запас в 5 минут до фактического истечения токена
+            ttl = (tokens["expiry"] - datetime.now(timezone.utc)).total_seconds() - 300
+            self._refreshed_tokens[refresh_token] = (time.monotonic() + ttl, tokens)
+            return tokens
+
+    @staticmethod
+    def _build_contacts_headers(access_token: str) -> httpx.Headers:
+        """Собирает заголовки запроса контактов с готовым байтовым представлением"""
+        return httpx.Headers({
+            "Authorization": f"Bearer {access_token}",
+            "Accept-Encoding": "gzip"
+        })
+
+    async def _fetch_page(self, headers: httpx.Headers, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Загружает одну страницу контактов потоково
+
+        Тело ответа читается по частям, поэтому между кусками сети цикл событий
+        не блокируется, а httpx не держит вторую копию тела в Response.content
+
+        Args:
+            headers: Заголовки запроса с токеном доступа
+            params: Параметры запроса (personFields, pageSize, pageToken)
+
+        Returns:
+            Разобранный JSON страницы или None при ответе 401
+        """
+        # Соблюдаем квоту People API до запроса, чтобы не получать 429
+        await self._contacts_limiter.acquire()
+
+        async with self._client.stream("GET", self.contacts_url, headers=headers, params=params) as response:
+            if response.status_code == 401:
+                await response.aread()
+                return None
+
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+
+            response.raise_for_status()
+            return orjson.loads(bytes(buffer))
+
+    async def iter_contact_pages(self, access_token: str,
+                                 refresh_token: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Постранично получает контакты пользователя из Google Contacts
+
+        Отдает каждую страницу сразу после получения, что позволяет вызывающему
+        коду обрабатывать контакты параллельно с загрузкой следующих страниц
+
         Args:
             access_token: Токен доступа
             refresh_token: Токен обновления (опционально)
-            
-        Returns:
-            Список контактов пользователя
-            
+
+        Yields:
+            Список обработанных контактов очередной страницы
+
         Raises:
             Exception: При ошибке получения контактов
         """
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-        
-        params = {
-            "personFields": "names,emailAddresses,phoneNumbers,organizations,biographies,urls",
-            "pageSize": 100  # Максимальный размер страницы
-        }
-        
-        contacts = []
+        # httpx.Headers кэширует байтовое представление, поэтому объект
+        # собираем один раз и переиспользуем для всех страниц
+        headers = self._build_contacts_headers(access_token)
+
+        params = dict(self._contacts_params_base)
+
         next_page_token = None
-        
+
         try:
-            async with httpx.AsyncClient() as client:
-                # Получаем контакты постранично
-                while True:
-                    if next_page_token:
-                        params["pageToken"] = next_page_token
-                    
-                    response = await client.get(self.contacts_url, headers=headers, params=params)
-                    
-                    # Если токен истек, пробуем обновить его
-                    if response.status_code == 401 and refresh_token:
-                        tokens = await self.refresh_access_token(refresh_token)
-                        headers["Authorization"] = f"Bearer {tokens['access_token']}"
-                        response = await client.get(self.contacts_url, headers=headers, params=params)
-                    
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    # Обрабатываем полученные контакты
-                    connections = data.get("connections", [])
-                    contacts.extend(self._process_contact_data(connection) for connection in connections)
-                    
-                    # Проверяем наличие следующей страницы
-                    next_page_token = data.get("nextPageToken")
-                    if not next_page_token:
-                        break
-                        
-                return contacts
-                
+            # Получаем контакты постранично
+            while True:
+                if next_page_token:
+                    params["pageToken"] = next_page_token
+
+                data = await self._fetch_page(headers, params)
+
+                # Если токен истек, пробуем обновить его
+                if data is None and refresh_token:
+                    # Сбрасываем кэш: закэшированный токен больше не принимается API
+                    self._refreshed_tokens.pop(refresh_token, None)
+                    tokens = await self._get_valid_access_token(refresh_token)
+                    # Собираем новый объект заголовков вместо мутации старого
+                    headers = self._build_contacts_headers(tokens["access_token"])
+                    data = await self._fetch_page(headers, params)
+
+                if data is None:
+                    raise Exception("Токен доступа не принят Google API (401)")
+
+                # Обрабатываем полученные контакты
+                connections = data.get("connections", [])
+                yield [self._process_contact_data(connection) for connection in connections]
+
+                # Проверяем наличие следующей страницы
+                next_page_token = data.get("nextPageToken")
+                if not next_page_token:
+                    break
+
         except Exception as e:
             logger.error(f"Ошибка при получении контактов Google: {e}")
             raise Exception(f"Не удалось получить контакты: {e}")
+
+    async def get_contacts(self, access_token: str, refresh_token: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Получает список контактов пользователя из Google Contacts
+
+        Args:
+            access_token: Токен доступа
+            refresh_token: Токен обновления (опционально)
+
+        Returns:
+            Список контактов пользователя
+
+        Raises:
+            Exception: При ошибке получения контактов
+        """
+        contacts = []
+        async for page in self.iter_contact_pages(access_token, refresh_token):
+            contacts.extend(page)
+        return contacts
     
     def _process_contact_data(self, contact_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Обрабатывает данные контакта из Google API
-        
+
+        Самый горячий чисто вычислительный код синхронизации: вызывается
+        на каждый контакт каждой страницы. Метод словаря и результаты
+        _pick_primary связываются с локальными именами, а результат
+        собирается одним словарным литералом — без повторных разрешений
+        атрибутов и промежуточных записей по ключу
+
         Args:
             contact_data: Данные контакта из Google API
-            
+
         Returns:
             Обработанные данные контакта в удобном формате
         """
-        result = {
-            "google_id": contact_data.get("resourceName", "").replace("people/", ""),
-            "name": "",
-            "email": "",
-            "phone": "",
-            "company": "",
-            "position": "",
-            "notes": "",
-            "social_links": []
+        get = contact_data.get
+
+        name = _pick_primary(get("names"))
+        email = _pick_primary(get("emailAddresses"))
+        phone = _pick_primary(get("phoneNumbers"))
+        org = _pick_primary(get("organizations"))
+        bio = _pick_primary(get("biographies"))
+
+        return {
+            "google_id": get("resourceName", "").replace("people/", ""),
+            "name": name.get("displayName", "") if name else "",
+            "email": email.get("value", "") if email else "",
+            "phone": phone.get("value", "") if phone else "",
+            "company": org.get("name", "") if org else "",
+            "position": org.get("title", "") if org else "",
+            "notes": bio.get("value", "") if bio else "",
+            "social_links": [
+                {"platform": url.get("type", "website"), "url": url.get("value", "")}
+                for url in get("urls", ())
+            ],
         }
-        
-        # Обрабатываем имя
-        names = contact_data.get("names", [])
-        if names:
-            primary_name = next((name for name in names if name.get("metadata", {}).get("primary", False)), names[0])
-            result["name"] = primary_name.get("displayName", "")
-        
-        # Обрабатываем email
-        emails = contact_data.get("emailAddresses", [])
-        if emails:
-            primary_email = next((email for email in emails if email.get("metadata", {}).get("primary", False)), emails[0])
-            result["email"] = primary_email.get("value", "")
-        
-        # Обрабатываем телефон
-        phones = contact_data.get("phoneNumbers", [])
-        if phones:
-            primary_phone = next((phone for phone in phones if phone.get("metadata", {}).get("primary", False)), phones[0])
-            result["phone"] = primary_phone.get("value", "")
-        
-        # Обрабатываем организацию
-        organizations = contact_data.get("organizations", [])
-        if organizations:
-            primary_org = next((org for org in organizations if org.get("metadata", {}).get("primary", False)), organizations[0])
-            result["company"] = primary_org.get("name", "")
-            result["position"] = primary_org.get("title", "")
-        
-        # Обрабатываем заметки
-        biographies = contact_data.get("biographies", [])
-        if biographies:
-            primary_bio = next((bio for bio in biographies if bio.get("metadata", {}).get("primary", False)), biographies[0])
-            result["notes"] = primary_bio.get("value", "")
-        
-        # Обрабатываем ссылки на соцсети
-        urls = contact_data.get("urls", [])
-        for url in urls:
-            social_link = {
-                "platform": url.get("type", "website"),
-                "url": url.get("value", "")
-            }
-            result["social_links"].append(social_link)
-        
-        return result
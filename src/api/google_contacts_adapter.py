@@ -8,9 +8,13 @@
 Авторы: Сергей Дышкант, Андрианов Вячеслав
 """
 
-from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 
+import orjson
 from loguru import logger
 
 # Исправлены относительные импорты для корректного запуска бота
@@ -19,6 +23,75 @@ from src.database.database import DatabaseManager
 from src.database.models import User, Contact, SocialLink
 
 
+# Поля контакта, которые синхронизируются из Google
+_SYNC_FIELDS = ("name", "email", "phone", "company", "position", "notes")
+
+
+@dataclass(slots=True)
+class SyncStats:
+    """Счетчики результатов синхронизации контактов
+
+    Слотированные атрибуты дешевле инкрементов по строковым ключам словаря
+    в горячем цикле обработки
+    """
+    total: int = 0
+    added: int = 0
+    updated: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+    def merge(self, other: "SyncStats") -> None:
+        """Прибавляет счетчики другой страницы синхронизации"""
+        self.total += other.total
+        self.added += other.added
+        self.updated += other.updated
+        self.failed += other.failed
+        self.skipped += other.skipped
+
+    def as_dict(self) -> Dict[str, int]:
+        """Представление для внешних потребителей (сообщения бота, журнал)"""
+        return {
+            "total": self.total,
+            "added": self.added,
+            "updated": self.updated,
+            "failed": self.failed,
+            "skipped": self.skipped
+        }
+
+
+def _is_valid_contact(contact_data: Dict[str, Any]) -> bool:
+    """Проверяет, что контакт пригоден для сохранения в БД
+
+    Дешевая проверка вместо try/except на каждый контакт: нужен google_id
+    и хотя бы одно из полей имя/email/телефон
+    """
+    if not contact_data["google_id"]:
+        return False
+    return bool(contact_data["name"] or contact_data["email"] or contact_data["phone"])
+
+
+def _payload_hash(contact_data: Dict[str, Any]) -> str:
+    """Считает короткий хэш данных контакта из Google
+
+    Совпадение хэша с сохраненным на контакте позволяет пропустить
+    и сравнение полей, и запрос социальных ссылок
+    """
+    payload = orjson.dumps(contact_data, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Приводит datetime к наивному UTC — формату, в котором БД хранит даты"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _utcnow() -> datetime:
+    """Текущий момент UTC в наивном виде (замена устаревшего datetime.utcnow)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class GoogleContactsAdapter:
     """
     Класс-адаптер для интеграции Google Contacts API с базой данных.
@@ -35,7 +108,33 @@ class GoogleContactsAdapter:
         """
         self.google_api = google_api
         self.db_manager = db_manager
-    
+        # Кэш токенов доступа в памяти: telegram_id -> (access_token, expiry).
+        # Позволяет при повторных синхронизациях не ходить в БД и к endpoint'у
+        # обновления токена, пока токен ещё действителен
+        self._token_cache: Dict[int, Tuple[str, datetime]] = {}
+        # URL авторизации детерминирован для данной конфигурации —
+        # запоминаем его при первом обращении
+        self._auth_url: Optional[str] = None
+
+    # Запас времени до истечения токена, при котором он ещё считается действующим
+    _TOKEN_TTL_BUFFER = timedelta(minutes=5)
+
+    def _get_cached_token(self, telegram_id: int) -> Optional[str]:
+        """Возвращает закэшированный токен доступа, если он ещё действителен"""
+        entry = self._token_cache.get(telegram_id)
+        if entry and entry[1] - _utcnow() > self._TOKEN_TTL_BUFFER:
+            return entry[0]
+        return None
+
+    def _cache_token(self, telegram_id: int, access_token: str, expiry: Optional[datetime]) -> None:
+        """Сохраняет токен доступа в кэше"""
+        if expiry:
+            self._token_cache[telegram_id] = (access_token, expiry)
+
+    def _invalidate_token(self, telegram_id: int) -> None:
+        """Удаляет токен пользователя из кэша (например, после 401 от API)"""
+        self._token_cache.pop(telegram_id, None)
+
     async def authorize_user(self, telegram_id: int, auth_code: str) -> Dict[str, Any]:
         """
         Авторизует пользователя в Google и сохраняет токены
@@ -60,13 +159,17 @@ class GoogleContactsAdapter:
                 raise Exception(f"Пользователь с Telegram ID {telegram_id} не найден")
             
             # Обновляем информацию о токенах
+            token_expiry = _to_naive_utc(tokens["expiry"])
             await self.db_manager.update_google_tokens(
                 telegram_id=telegram_id,
                 access_token=tokens["access_token"],
                 refresh_token=tokens.get("refresh_token"),
-                token_expiry=tokens["expiry"]
+                token_expiry=token_expiry
             )
-            
+
+            # Кэшируем свежий токен для последующих синхронизаций
+            self._cache_token(telegram_id, tokens["access_token"], token_expiry)
+
             return {
                 "success": True,
                 "message": "Авторизация в Google успешно выполнена"
@@ -86,179 +189,185 @@ class GoogleContactsAdapter:
         Returns:
             URL для авторизации
         """
-        return self.google_api.get_auth_url()
+        if self._auth_url is None:
+            self._auth_url = self.google_api.get_auth_url()
+        return self._auth_url
     
-    async def sync_contacts_from_google(self, telegram_id: int) -> Dict[str, Any]:
+    async def sync_contacts_from_google(self, telegram_id: int) -> AsyncIterator[Dict[str, Any]]:
         """
         Синхронизирует контакты из Google Contacts с базой данных
-        
+
+        Асинхронный генератор: после каждой обработанной страницы отдает
+        промежуточную статистику, чтобы обработчик мог показывать прогресс,
+        а в конце — итоговый словарь с флагом done
+
         Args:
             telegram_id: Telegram ID пользователя
-            
-        Returns:
-            Словарь с результатами синхронизации
-            
+
+        Yields:
+            Промежуточные счетчики ({"done": False, ...}) и финальный
+            результат ({"done": True, "success": ..., "stats": ..., "message": ...})
+
         Raises:
             ValueError: Если пользователь не авторизован в Google
         """
+        # Явные сентинели вместо инспекции locals() в обработчике ошибок
+        sync_log_id = None
+        sync_log_task = None
+
         try:
+            # Единая временная метка начала синхронизации: переиспользуется
+            # всеми проверками вместо повторных вызовов datetime.utcnow()
+            now = _utcnow()
+
             # Проверяем авторизацию пользователя в Google
-            user = await self.db_manager.get_user_by_telegram_id(telegram_id)
+            user = await self.db_manager.get_user(telegram_id)
             
             if not user or not user.google_token:
                 logger.warning(f"Пользователь {telegram_id} не авторизован в Google")
                 raise ValueError("Вы не авторизованы в Google. Пожалуйста, авторизуйтесь.")
             
-            # Проверяем срок действия токена и обновляем его при необходимости
-            now = datetime.utcnow()
-            if user.token_expiry and user.token_expiry <= now and user.google_refresh_token:
-                logger.info(f"Обновляем токен для пользователя {telegram_id}")
-                tokens = await self.google_api.refresh_access_token(user.google_refresh_token)
-                
-                # Обновляем токены в базе данных
-                update_data = {
-                    "google_token": tokens["access_token"],
-                    "token_expiry": datetime.utcnow().replace(microsecond=0) + \
-                                    tokens.get("expires_in_timedelta", tokens.get("expires_in", 3600))
-                }
-                await self.db_manager.update_user(user.id, update_data)
-                user.google_token = update_data["google_token"]
-            
-            # Создаем запись в журнале синхронизации
-            sync_log = await self.db_manager.create_sync_log(user.id)
-            
-            # Получаем контакты из Google
-            google_contacts = await self.google_api.get_contacts(user.google_token, user.google_refresh_token)
+            # Сначала проверяем кэш токенов в памяти
+            cached_token = self._get_cached_token(telegram_id)
+            if cached_token:
+                user.google_token = cached_token
+            else:
+                # Проверяем срок действия токена и обновляем его при необходимости
+                if user.token_expiry and user.token_expiry <= now and user.google_refresh_token:
+                    logger.info(f"Обновляем токен для пользователя {telegram_id}")
+                    tokens = await self.google_api.refresh_access_token(user.google_refresh_token)
+
+                    # Обновляем токены в базе данных
+                    update_data = {
+                        "google_token": tokens["access_token"],
+                        "token_expiry": _to_naive_utc(tokens["expiry"])
+                    }
+                    await self.db_manager.update_user(telegram_id, **update_data)
+                    user.google_token = update_data["google_token"]
+                    user.token_expiry = update_data["token_expiry"]
+
+                # Запоминаем действующий токен, чтобы не обращаться к БД при повторных синхронизациях
+                self._cache_token(telegram_id, user.google_token, user.token_expiry)
             
-            # Обрабатываем контакты и сохраняем результаты в базе данных
-            result = await self._process_contacts(user.id, google_contacts)
+            # Запись в журнале синхронизации создается параллельно
+            # с загрузкой первой страницы контактов
+            sync_log_task = asyncio.create_task(self.db_manager.create_sync_log(user.id))
+
+            # Получаем контакты из Google постранично: обработка страницы в БД
+            # перекрывается с загрузкой следующей страницы
+            result = SyncStats()
+            async for page in self.google_api.iter_contact_pages(user.google_token, user.google_refresh_token):
+                result.merge(await self._process_contacts(user.id, page))
+                yield {"done": False, **result.as_dict()}
+
+            sync_log_id = await sync_log_task
             
             # Обновляем статус синхронизации
             update_data = {
-                "end_time": datetime.utcnow(),
+                "end_time": _utcnow(),
                 "success": True,
-                "total_contacts": result["total"],
-                "added_contacts": result["added"],
-                "updated_contacts": result["updated"],
-                "failed_contacts": result["failed"],
-                "skipped_contacts": result["skipped"]
+                "total_contacts": result.total,
+                "added_contacts": result.added,
+                "updated_contacts": result.updated,
+                "failed_contacts": result.failed,
+                "skipped_contacts": result.skipped
             }
-            await self.db_manager.update_sync_log(sync_log.id, update_data)
-            
-            return {
+            await self.db_manager.update_sync_log(sync_log_id, update_data)
+
+            yield {
+                "done": True,
                 "success": True,
-                "stats": result,
+                "stats": result.as_dict(),
                 "message": "Синхронизация контактов успешно выполнена"
             }
-            
+
         except ValueError as e:
             logger.warning(f"Ошибка при синхронизации контактов: {e}")
             raise
         except Exception as e:
             logger.error(f"Неизвестная ошибка при синхронизации контактов: {e}")
-            
+
+            # Токен мог устареть или быть отозван — сбрасываем кэш
+            self._invalidate_token(telegram_id)
+
+            # Дожидаемся создания записи журнала, если оно было запущено,
+            # чтобы зафиксировать в ней ошибку
+            if sync_log_id is None and sync_log_task is not None:
+                try:
+                    sync_log_id = await sync_log_task
+                except Exception as log_error:
+                    logger.error(f"Не удалось создать запись журнала синхронизации: {log_error}")
+
             # Обновляем статус синхронизации в случае ошибки
-            if locals().get('sync_log'):
+            if sync_log_id:
                 update_data = {
-                    "end_time": datetime.utcnow(),
+                    "end_time": _utcnow(),
                     "success": False,
                     "error_message": str(e)
                 }
-                await self.db_manager.update_sync_log(sync_log.id, update_data)
-            
-            return {
+                await self.db_manager.update_sync_log(sync_log_id, update_data)
+
+            yield {
+                "done": True,
                 "success": False,
-                "stats": {
-                    "total": 0,
-                    "added": 0,
-                    "updated": 0,
-                    "failed": 0,
-                    "skipped": 0
-                },
+                "stats": SyncStats().as_dict(),
                 "message": f"Ошибка синхронизации: {str(e)}"
             }
     
-    async def _create_contact(self, user_id: int, contact_data: Dict[str, Any]) -> Contact:
-        """
-        Создает новый контакт в базе данных на основе данных из Google
-        
-        Args:
-            user_id: ID пользователя в базе данных
-            contact_data: Данные контакта из Google Contacts
-            
-        Returns:
-            Созданный объект контакта
-        """
-        # Создаем основную запись контакта
-        contact = await self.db_manager.add_contact(
-            user_id=user_id,
-            name=contact_data["name"],
-            email=contact_data["email"],
-            phone=contact_data["phone"],
-            google_id=contact_data["google_id"],
-            company=contact_data["company"],
-            position=contact_data["position"],
-            notes=contact_data["notes"]
-        )
-        
-        # Добавляем ссылки на социальные сети
-        for social_link in contact_data["social_links"]:
-            await self.db_manager.add_social_link(
-                contact_id=contact.id,
-                platform=social_link["platform"],
-                url=social_link["url"]
-            )
-        
-        return contact
-    
-    async def _update_contact(self, contact: Contact, contact_data: Dict[str, Any]) -> bool:
+    async def _update_contact(self, contact: Contact, contact_data: Dict[str, Any],
+                              current_urls: Optional[set] = None,
+                              payload_hash: Optional[str] = None) -> bool:
         """
         Обновляет существующий контакт данными из Google
-        
+
         Args:
             contact: Объект контакта для обновления
             contact_data: Новые данные контакта из Google
-            
+            current_urls: Заранее загруженные URL социальных ссылок контакта
+                (если не переданы, будут запрошены из БД)
+            payload_hash: Хэш данных контакта для быстрой проверки изменений
+                при следующей синхронизации
+
         Returns:
             True если контакт был обновлен, False если изменений не было
         """
-        # Проверяем, есть ли изменения в основных данных
-        changes = {}
-        if contact.name != contact_data["name"] and contact_data["name"]:
-            changes["name"] = contact_data["name"]
-        if contact.email != contact_data["email"] and contact_data["email"]:
-            changes["email"] = contact_data["email"]
-        if contact.phone != contact_data["phone"] and contact_data["phone"]:
-            changes["phone"] = contact_data["phone"]
-        if contact.company != contact_data["company"] and contact_data["company"]:
-            changes["company"] = contact_data["company"]
-        if contact.position != contact_data["position"] and contact_data["position"]:
-            changes["position"] = contact_data["position"]
-        if contact.notes != contact_data["notes"] and contact_data["notes"]:
-            changes["notes"] = contact_data["notes"]
-        
+        # Проверяем, есть ли изменения в основных данных: берем только
+        # непустые значения, отличающиеся от текущих
+        changes = {
+            field: value
+            for field in _SYNC_FIELDS
+            if (value := contact_data[field]) and getattr(contact, field) != value
+        }
+        updated = bool(changes)
+
+        # Хэш сохраняем и когда менять нечего — чтобы следующая синхронизация
+        # отсекла этот контакт по совпадению хэша
+        if payload_hash and contact.payload_hash != payload_hash:
+            changes["payload_hash"] = payload_hash
+
         # Обновляем контакт, если есть изменения
         if changes:
             await self.db_manager.update_contact(contact.id, **changes)
         
         # Обрабатываем социальные ссылки
-        # Получаем текущие ссылки
-        current_links = await self.db_manager.get_social_links(contact.id)
-        current_urls = {link.url for link in current_links}
-        
-        # Добавляем новые ссылки
-        for social_link in contact_data["social_links"]:
-            if social_link["url"] not in current_urls:
-                await self.db_manager.add_social_link(
-                    contact_id=contact.id,
-                    platform=social_link["platform"],
-                    url=social_link["url"]
-                )
-                changes["social_links"] = True
-        
-        return bool(changes)
+        if current_urls is None:
+            # Запасной путь: получаем текущие ссылки отдельным запросом
+            current_links = await self.db_manager.get_social_links(contact.id)
+            current_urls = {link.url for link in current_links}
+
+        # Новые ссылки добавляем одним пакетом вместо запроса на каждую
+        links_to_add = [
+            {"contact_id": contact.id, "platform": social_link["platform"], "url": social_link["url"]}
+            for social_link in contact_data["social_links"]
+            if social_link["url"] not in current_urls
+        ]
+        if links_to_add:
+            await self.db_manager.add_social_links_bulk(links_to_add)
+            updated = True
+
+        return updated
     
-    async def _process_contacts(self, user_id: int, google_contacts: List[Dict[str, Any]]) -> Dict[str, int]:
+    async def _process_contacts(self, user_id: int, google_contacts: List[Dict[str, Any]]) -> SyncStats:
         """
         Обрабатывает контакты из Google и сохраняет результаты в базе данных
         
@@ -267,37 +376,121 @@ class GoogleContactsAdapter:
             google_contacts: Список контактов из Google Contacts
             
         Returns:
-            Словарь с результатами обработки контактов
+            Счетчики результатов обработки контактов
         """
         # Статистика обработки контактов
-        stats = {
-            "total": len(google_contacts),
-            "added": 0,
-            "updated": 0,
-            "failed": 0,
-            "skipped": 0
-        }
-        
-        # Обрабатываем каждый контакт
+        stats = SyncStats(total=len(google_contacts))
+
+        # Отбрасываем непригодные контакты до обращения к БД
+        valid_contacts = []
         for contact_data in google_contacts:
-            try:
-                # Ищем контакт в базе данных по Google ID
-                existing_contact = await self.db_manager.get_contact_by_google_id(user_id, contact_data["google_id"])
-                
-                if existing_contact:
-                    # Обновляем существующий контакт
-                    updated = await self._update_contact(existing_contact, contact_data)
-                    if updated:
-                        stats["updated"] += 1
-                    else:
-                        stats["skipped"] += 1
-                else:
-                    # Создаем новый контакт
-                    await self._create_contact(user_id, contact_data)
-                    stats["added"] += 1
-                    
-            except Exception as e:
-                logger.error(f"Ошибка при обработке контакта: {e}")
-                stats["failed"] += 1
-        
+            if _is_valid_contact(contact_data):
+                valid_contacts.append(contact_data)
+            else:
+                stats.skipped += 1
+
+        # Один запрос вместо N: получаем все существующие контакты по Google ID
+        google_ids = [contact_data["google_id"] for contact_data in valid_contacts]
+        existing_by_google_id = await self.db_manager.get_contacts_by_google_ids(user_id, google_ids)
+
+        # Хэш считается один раз на контакт и попадает в данные для вставки
+        hashed = []
+        for contact_data in valid_contacts:
+            payload_hash = _payload_hash(contact_data)
+            contact_data["payload_hash"] = payload_hash
+            hashed.append((contact_data, payload_hash))
+
+        # Разбиение на новые и измененные — чисто в памяти, двумя
+        # включениями по готовой карте существующих контактов. Контакты
+        # с совпадающим хэшем не попадают ни в один из списков
+        existing_ids = existing_by_google_id.keys()
+        to_create = [
+            contact_data
+            for contact_data, _ in hashed
+            if contact_data["google_id"] not in existing_ids
+        ]
+        to_update = [
+            (existing_by_google_id[contact_data["google_id"]], contact_data, payload_hash)
+            for contact_data, payload_hash in hashed
+            if contact_data["google_id"] in existing_ids
+            and existing_by_google_id[contact_data["google_id"]].payload_hash != payload_hash
+        ]
+        stats.skipped += len(hashed) - len(to_create) - len(to_update)
+
+        # Потоки вставки и обновления независимы — выполняем их параллельно
+        await asyncio.gather(
+            self._create_contacts_bulk(user_id, to_create, stats),
+            self._update_contacts_bulk(to_update, stats)
+        )
+
         return stats
+
+    async def _create_contacts_bulk(self, user_id: int, to_create: List[Dict[str, Any]],
+                                    stats: SyncStats) -> None:
+        """
+        Пакетно создает новые контакты и их социальные ссылки
+
+        Args:
+            user_id: ID пользователя в базе данных
+            to_create: Список данных контактов для создания
+            stats: Счетчики, в которые записывается результат
+        """
+        if not to_create:
+            return
+
+        try:
+            created = await self.db_manager.add_contacts_bulk(user_id, to_create)
+            social_links = [
+                {"contact_id": contact.id, "platform": link["platform"], "url": link["url"]}
+                for contact, contact_data in zip(created, to_create)
+                for link in contact_data["social_links"]
+            ]
+            await self.db_manager.add_social_links_bulk(social_links)
+            stats.added += len(created)
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном добавлении контактов: {e}")
+            stats.failed += len(to_create)
+
+    async def _update_contacts_bulk(self, to_update: List[Tuple[Contact, Dict[str, Any], str]],
+                                    stats: SyncStats) -> None:
+        """
+        Обновляет измененные контакты с ограничением параллелизма
+
+        Args:
+            to_update: Список кортежей (контакт, данные из Google, хэш данных)
+            stats: Счетчики, в которые записывается результат
+        """
+        if not to_update:
+            return
+
+        # Ссылки всех обновляемых контактов получаем одним запросом,
+        # а не по запросу на контакт внутри _update_contact
+        urls_by_contact = await self.db_manager.get_social_links_for_contacts(
+            [contact.id for contact, _, _ in to_update]
+        )
+
+        # Обновления выполняем параллельно с ограничением на число обращений к БД
+        semaphore = asyncio.Semaphore(10)
+
+        async def update_one(contact: Contact, contact_data: Dict[str, Any], payload_hash: str) -> bool:
+            async with semaphore:
+                return await self._update_contact(
+                    contact, contact_data,
+                    current_urls=urls_by_contact.get(contact.id, set()),
+                    payload_hash=payload_hash
+                )
+
+        results = await asyncio.gather(
+            *(update_one(contact, contact_data, payload_hash)
+              for contact, contact_data, payload_hash in to_update),
+            return_exceptions=True
+        )
+
+        for outcome in results:
+            if isinstance(outcome, Exception):
+                logger.error(f"Ошибка при обработке контакта: {outcome}")
+                stats.failed += 1
+            elif outcome:
+                stats.updated += 1
+            else:
+                stats.skipped += 1
@@ -9,9 +9,10 @@
 """
 
 import asyncio
+import time
+from functools import lru_cache, wraps
 from typing import Dict, Any, Optional, List, Union
 import re
-from datetime import datetime
 
 from telegram import Update, User, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from telegram.ext import ContextTypes
@@ -23,10 +24,186 @@ from loguru import logger
 from src.database.database import DatabaseManager
 from src.sync.sync_manager import SyncManager
 from src.api.google_contacts_adapter import GoogleContactsAdapter
+from src.bot.rate_limiter import q_send, q_reply, q_reply_html, q_reply_markdown, q_edit
+
+# Предкомпилированный шаблон команды /auth_code: разбор сообщения без
+# промежуточных строк от str.split на каждый вызов
+_AUTH_CODE_RE = re.compile(r"^/auth_code(?:@\w+)?\s+(\S+)\s*$")
+
+# Код авторизации Google OAuth в свободном сообщении: один проход по строке
+# вместо тройной проверки startswith/in/len и точная грамматика кода
+_OAUTH_CODE_RE = re.compile(r"^4/[A-Za-z0-9_\-/]{18,}$")
+
+# Статичные тексты и клавиатуры неизменны в течение жизни процесса,
+# поэтому собираются один раз при загрузке модуля
+_HELP_TEXT = (
+    "📱 NetWorkGPT - ваш помощник для управления контактами.\n\n"
+    "Доступные команды:\n"
+    "/start - Начать работу с ботом\n"
+    "/help - Показать эту справку\n"
+    "/sync - Синхронизировать контакты с Google\n"
+    "/contact [имя] - Поиск информации о контакте\n"
+    "/add_note [имя] [текст] - Добавить заметку к контакту\n"
+    "/add_social [имя] [тип] [ссылка] - Добавить ссылку на соцсеть\n"
+    "/auth_code [код] - Ввести код авторизации Google\n\n"
+    "Для начала работы, синхронизируйте ваши контакты с Google."
+)
+
+_START_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Синхронизировать с Google", callback_data="auth_google")],
+    [InlineKeyboardButton("Помощь", callback_data="help")]
+])
+
+_HELP_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Синхронизировать с Google", callback_data="auth_google")],
+    [InlineKeyboardButton("О проекте", callback_data="about")]
+])
+
+_ABOUT_TEXT = (
+    "🤖 NetWorkGPT\n\n"
+    "Умный бот для управления контактами с интеграцией Google Contacts "
+    "и аналитикой на базе ИИ.\n\n"
+    "📊 Возможности:\n"
+    "• Синхронизация контактов с Google\n"
+    "• Умный поиск по контактам\n"
+    "• Добавление заметок и связей\n"
+    "• Аналитика вашей сети контактов\n\n"
+    "👨‍💻 Разработчики: Сергей Дышкант, Андрианов Вячеслав\n"
+    "🌐 Версия: 1.0"
+)
+
+
+# Шаблоны ответов с подстановками: текст задан в одном месте,
+# обработчики только подставляют значения через str.format
+_WELCOME_NEW_TMPL = (
+    "Добро пожаловать, {mention}! 👋\n\n"
+    "{welcome}\n\n"
+    "Для начала работы, авторизуйтесь в Google, чтобы синхронизировать контакты."
+)
+
+_WELCOME_RETURN_TMPL = (
+    "С возвращением, {mention}! 👋\n\n"
+    "Что бы вы хотели сделать сегодня?"
+)
+
+_SYNC_DONE_TMPL = (
+    "✅ Синхронизация завершена!\n\n"
+    "📊 Статистика:\n"
+    "- Всего контактов: {total}\n"
+    "- Добавлено: {added}\n"
+    "- Обновлено: {updated}\n"
+    "- Пропущено: {skipped}\n"
+    "- Ошибок: {failed}\n\n"
+    "Теперь вы можете просмотреть свои контакты и управлять ими."
+)
+
+_AUTH_ACK_TMPL = (
+    "Я получил код авторизации Google. Пожалуйста, используйте команду "
+    "/auth_code, чтобы ввести код: \n`{code_preview}...`"
+)
+
+# Единый текст ответа пользователю при необработанной ошибке
+_ERROR_TEXT = (
+    "Извините, произошла ошибка при обработке вашего запроса.\n"
+    "Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
+)
+
+
+def safe_handler(fn):
+    """Декоратор обработчиков команд: единый перехват необработанных ошибок
+
+    Логирует исключение и отвечает пользователю одним общим текстом —
+    вместо одинаковых try/except с копией строки в каждом обработчике
+    """
+    @wraps(fn)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        try:
+            return await fn(update, context, *args, **kwargs)
+        except Exception:
+            logger.exception(f"Ошибка в обработчике {fn.__name__}")
+            try:
+                await q_reply(update.message, _ERROR_TEXT)
+            except Exception:
+                pass  # Игнорируем ошибки при отправке сообщения об ошибке
+    return wrapper
+
+
+# Последние записанные в БД поля профиля: user_id -> (username, first_name, last_name).
+# Позволяет пропускать UPDATE на повторных /start, когда профиль не менялся
+_USER_CACHE: Dict[int, tuple] = {}
+_USER_CACHE_LIMIT = 10000
+
+
+def _remember_profile(user_id: int, profile: tuple) -> None:
+    """Запоминает поля профиля пользователя с ограничением размера кэша"""
+    if len(_USER_CACHE) >= _USER_CACHE_LIMIT and user_id not in _USER_CACHE:
+        # Простое FIFO-вытеснение самой старой записи
+        del _USER_CACHE[next(iter(_USER_CACHE))]
+    _USER_CACHE[user_id] = profile
+
+# Очередь уведомлений администратору и окно их накопления в секундах
+_ADMIN_NOTIFICATIONS: asyncio.Queue = asyncio.Queue()
+_ADMIN_FLUSH_INTERVAL = 10.0
+
+
+def _format_new_user(item: Dict[str, Any]) -> str:
+    """Форматирует строку уведомления о новом пользователе
+
+    Строки собираются одним str.join — одна непрерывная аллокация
+    на уведомление в цикле пакетной отправки
+    """
+    return "\n".join((
+        "Новый пользователь в NetWorkGPT!",
+        "",
+        f"Имя: {item['first_name'] or '-'} {item['last_name'] or ''}",
+        f"Username: @{item['username'] or '-'}",
+        f"Telegram ID: {item['user_id']}",
+        f"Дата: {time.strftime('%d.%m.%Y %H:%M:%S', time.localtime(item['ts']))}"
+    ))
+
+
+async def admin_notifications_worker(bot, admin_chat_id: int) -> None:
+    """Фоновая задача уведомлений администратора о новых пользователях
+
+    Копит регистрации в течение короткого окна и отправляет их одним
+    сообщением: N вызовов API схлопываются в один, а ответ пользователю
+    не ждет отправки уведомления
+
+    Args:
+        bot: Экземпляр бота для отправки сообщений
+        admin_chat_id: ID чата администратора из конфигурации
+    """
+    while True:
+        items = [await _ADMIN_NOTIFICATIONS.get()]
+        # Даем окну накопиться — в пике регистрации приходят пачками
+        await asyncio.sleep(_ADMIN_FLUSH_INTERVAL)
+        while not _ADMIN_NOTIFICATIONS.empty():
+            items.append(_ADMIN_NOTIFICATIONS.get_nowait())
+
+        try:
+            await q_send(bot, admin_chat_id, "\n\n---\n\n".join(map(_format_new_user, items)))
+            logger.info(f"Отправлено уведомление администратору о новых пользователях: {len(items)}")
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомления администратору: {e}")
+
+
+@lru_cache(maxsize=32)
+def _markup(buttons: tuple) -> InlineKeyboardMarkup:
+    """Собирает клавиатуру из кортежа пар (текст, callback_data)
+
+    Результат кэшируется: для статичных меню одна и та же разметка
+    переиспользуется вместо пересоздания на каждый ответ
+    """
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text, callback_data=data)]
+        for text, data in buttons
+    ])
+
 
 # Обработчики основных команд
 
-async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE, 
+@safe_handler
+async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE,
                       user: User, welcome_message: str, db_manager: DatabaseManager) -> None:
     """Обработчик команды /start
     
@@ -37,81 +214,69 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE,
         welcome_message: Приветственное сообщение из конфигурации
         db_manager: Менеджер базы данных
     """
-    # Проверяем, существует ли пользователь в базе
-    user_exists = await db_manager.user_exists(user.id)
-    
-    # Формируем клавиатуру
-    keyboard = [
-        [InlineKeyboardButton("Синхронизировать с Google", callback_data="auth_google")],
-        [InlineKeyboardButton("Помощь", callback_data="help")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    if user_exists:
-        # Если пользователь уже существует
-        try:
-            await update.message.reply_html(
-                f"С возвращением, {user.mention_html()}! 👋\n\n"
-                f"Что бы вы хотели сделать сегодня?",
-                reply_markup=reply_markup
-            )
-            # Обновляем информацию о пользователе, если она изменилась
-            await db_manager.update_user(
-                user.id, 
-                username=user.username, 
-                first_name=user.first_name, 
-                last_name=user.last_name
-            )
-        except Exception as e:
-            logger.error(f"Ошибка при обработке существующего пользователя: {e}")
-            await update.message.reply_text(
-                "Извините, произошла ошибка при обработке вашего запроса.\n"
-                "Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
+    profile = (user.username, user.first_name, user.last_name)
+    cached_profile = _USER_CACHE.get(user.id)
+    # user_data живет столько же, сколько процесс бота, и не вытесняется
+    # из профильного кэша — повторный /start известного пользователя
+    # не требует обращения к БД даже после вытеснения из _USER_CACHE
+    known_user = cached_profile is not None or context.user_data.get("registered", False)
+
+    try:
+        if cached_profile == profile:
+            # Пользователь известен и профиль не менялся — БД не трогаем
+            created = False
+        elif known_user:
+            # Пользователь точно существует, изменился только профиль —
+            # записываем его фоновой задачей, не задерживая ответ
+            created = False
+            context.application.create_task(
+                db_manager.upsert_user(user.id, *profile)
             )
+            _remember_profile(user.id, profile)
+        else:
+            # Холодный путь: один UPSERT вместо связки
+            # user_exists + add_user / update_user
+            info = await db_manager.upsert_user(user.id, *profile)
+            created = info["created"]
+            _remember_profile(user.id, profile)
+
+        context.user_data["registered"] = True
+    except Exception as e:
+        logger.error(f"Ошибка при регистрации пользователя: {e}")
+        await q_reply(update.message,
+            "Извините, произошла ошибка при регистрации.\n"
+            "Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
+        )
+        return
+
+    if created:
+        # Приветствуем нового пользователя
+        await q_reply_html(update.message,
+            _WELCOME_NEW_TMPL.format(mention=user.mention_html(), welcome=welcome_message),
+            reply_markup=_START_MARKUP
+        )
+
+        # Уведомление администратору уходит через фоновую очередь:
+        # ответ пользователю не ждет отправки, а всплеск регистраций
+        # схлопывается в одно сообщение. Без настроенного admin_chat_id
+        # воркер очереди не запущен — не копим записи, которые некому
+        # разбирать
+        if context.bot_data.get("admin_chat_id"):
+            _ADMIN_NOTIFICATIONS.put_nowait({
+                "user_id": user.id,
+                "username": user.username,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "ts": time.time()
+            })
     else:
-        # Если это новый пользователь
-        try:
-            # Сначала добавляем пользователя в базу данных
-            user_data = await db_manager.add_user(user.id, user.username, user.first_name, user.last_name)
-            
-            if not user_data:
-                raise ValueError("Не удалось добавить пользователя в базу данных")
-            
-            # Затем отправляем приветственное сообщение
-            await update.message.reply_html(
-                f"Добро пожаловать, {user.mention_html()}! 👋\n\n"
-                f"{welcome_message}\n\n"
-                f"Для начала работы, авторизуйтесь в Google, чтобы синхронизировать контакты.",
-                reply_markup=reply_markup
-            )
-            
-            # Отправляем уведомление администратору о новом пользователе
-            try:
-                admin_chat_id = 531712920  # ID чата @sergei_dyshkant
-                admin_message = (
-                    f"Новый пользователь в NetWorkGPT!\n\n"
-                    f"Имя: {user.first_name or '-'} {user.last_name or ''}\n"
-                    f"Username: @{user.username or '-'}\n"
-                    f"Telegram ID: {user.id}\n"
-                    f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"
-                )
-                
-                await context.bot.send_message(
-                    chat_id=admin_chat_id,
-                    text=admin_message
-                )
-                logger.info(f"Отправлено уведомление администратору о новом пользователе: {user.id}")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления администратору: {e}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при добавлении нового пользователя: {e}")
-            await update.message.reply_text(
-                "Извините, произошла ошибка при регистрации.\n"
-                "Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
-            )
+        await q_reply_html(update.message,
+            _WELCOME_RETURN_TMPL.format(mention=user.mention_html()),
+            reply_markup=_START_MARKUP
+        )
 
 
+@safe_handler
 async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /help
     
@@ -119,33 +284,14 @@ async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         update: Объект обновления Telegram
         context: Контекст бота
     """
-    help_text = (
-        "📱 NetWorkGPT - ваш помощник для управления контактами.\n\n"
-        "Доступные команды:\n"
-        "/start - Начать работу с ботом\n"
-        "/help - Показать эту справку\n"
-        "/sync - Синхронизировать контакты с Google\n"
-        "/contact [имя] - Поиск информации о контакте\n"
-        "/add_note [имя] [текст] - Добавить заметку к контакту\n"
-        "/add_social [имя] [тип] [ссылка] - Добавить ссылку на соцсеть\n"
-        "/auth_code [код] - Ввести код авторизации Google\n\n"
-        "Для начала работы, синхронизируйте ваши контакты с Google."
-    )
-    
-    # Формируем кнопки
-    keyboard = [
-        [InlineKeyboardButton("Синхронизировать с Google", callback_data="auth_google")],
-        [InlineKeyboardButton("О проекте", callback_data="about")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_markdown(
-        help_text,
-        reply_markup=reply_markup
+    await q_reply_markdown(update.message,
+        _HELP_TEXT,
+        reply_markup=_HELP_MARKUP
     )
 
 
-async def handle_sync(update: Update, context: ContextTypes.DEFAULT_TYPE, 
+@safe_handler
+async def handle_sync(update: Update, context: ContextTypes.DEFAULT_TYPE,
                      sync_manager: SyncManager, db_manager: DatabaseManager,
                      google_adapter: GoogleContactsAdapter) -> None:
     """Обработчик команды /sync - синхронизация контактов
@@ -158,20 +304,36 @@ async def handle_sync(update: Update, context: ContextTypes.DEFAULT_TYPE,
         google_adapter: Адаптер для работы с Google Contacts API
     """
     user_id = update.effective_user.id
-    
-    # Проверяем, авторизован ли пользователь в Google
-    is_authorized = await db_manager.is_google_authorized(user_id)
-    
+
+    # Проверяем, авторизован ли пользователь в Google. Факт авторизации
+    # меняется редко, поэтому кэшируем его в user_data на 5 минут,
+    # чтобы не ходить в БД на каждое нажатие /sync
+    auth_cache = context.user_data.setdefault("_auth_cache", {})
+    if auth_cache.get("expires", 0) < time.monotonic():
+        # Проверка в БД и получение URL авторизации независимы — выполняем
+        # их параллельно, чтобы URL был готов к моменту, когда выяснится,
+        # что он нужен (неавторизованный пользователь — самая дорогая ветка)
+        is_authorized, auth_url = await asyncio.gather(
+            db_manager.is_google_authorized(user_id),
+            google_adapter.get_user_google_auth_url()
+        )
+        auth_cache["ok"] = is_authorized
+        auth_cache["expires"] = time.monotonic() + 300
+    else:
+        is_authorized = auth_cache["ok"]
+        auth_url = None
+
     if not is_authorized:
         # Если пользователь не авторизован, предлагаем авторизоваться
-        auth_url = await google_adapter.get_user_google_auth_url()
-        
+        if auth_url is None:
+            auth_url = await google_adapter.get_user_google_auth_url()
+
         keyboard = [
             [InlineKeyboardButton("Авторизоваться в Google", url=auth_url)]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
+        await q_reply(update.message,
             "Для синхронизации контактов необходимо авторизоваться в Google.\n"
             "Нажмите кнопку ниже, чтобы начать процесс авторизации.",
             reply_markup=reply_markup
@@ -179,47 +341,52 @@ async def handle_sync(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     # Отправляем сообщение о начале синхронизации
-    progress_message = await update.message.reply_text("Начинаю синхронизацию контактов... ⏳")
+    progress_message = await q_reply(update.message,"Начинаю синхронизацию контактов... ⏳")
     
     try:
-        # Запускаем процесс синхронизации
-        result = await google_adapter.sync_contacts_from_google(user_id)
-        
-        if result["success"]:
+        # Запускаем процесс синхронизации; адаптер отдает промежуточную
+        # статистику после каждой страницы. Прогресс показываем не чаще
+        # раза в 1.5 секунды, чтобы не упереться в лимит правок на чат
+        result = None
+        last_edit = time.monotonic()
+        async for progress in google_adapter.sync_contacts_from_google(user_id):
+            if progress.get("done"):
+                result = progress
+                break
+
+            now = time.monotonic()
+            if now - last_edit >= 1.5:
+                await q_edit(progress_message,
+                    f"⏳ Синхронизация: обработано {progress['total']} контактов\n"
+                    f"(добавлено {progress['added']}, обновлено {progress['updated']})..."
+                )
+                last_edit = now
+
+        if result and result["success"]:
             # Обновляем сообщение с результатами
             stats = result["stats"]
-            await progress_message.edit_text(
-                f"✅ Синхронизация завершена!\n\n"
-                f"📊 Статистика:\n"
-                f"- Всего контактов: {stats['total']}\n"
-                f"- Добавлено: {stats['added']}\n"
-                f"- Обновлено: {stats['updated']}\n"
-                f"- Пропущено: {stats['skipped']}\n"
-                f"- Ошибок: {stats['failed']}"
-            )
-            
-            # Предлагаем просмотреть контакты
-            keyboard = [
-                [InlineKeyboardButton("Просмотреть контакты", callback_data="list_contacts")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                "Теперь вы можете просмотреть свои контакты и управлять ими.",
-                reply_markup=reply_markup
-            )
+
+            # Итоги и предложение просмотреть контакты — одно редактирование
+            # вместо двух подряд сообщений в тот же чат; отправка идет
+            # фоновой задачей, не блокируя возврат из обработчика
+            context.application.create_task(q_edit(progress_message,
+                _SYNC_DONE_TMPL.format(**stats),
+                reply_markup=_markup((("Просмотреть контакты", "list_contacts"),))
+            ))
         else:
             # Если синхронизация не удалась
-            await progress_message.edit_text(
-                f"❌ Произошла ошибка при синхронизации: {result['message']}"
+            message = result["message"] if result else "синхронизация прервана"
+            await q_edit(progress_message,
+                f"❌ Произошла ошибка при синхронизации: {message}"
             )
     except Exception as e:
         logger.error(f"Ошибка при синхронизации контактов: {e}")
-        await progress_message.edit_text(
+        await q_edit(progress_message,
             f"❌ Произошла ошибка при синхронизации: {str(e)}"
         )
 
 
+@safe_handler
 async def handle_auth_code(update: Update, context: ContextTypes.DEFAULT_TYPE,
                          google_adapter: GoogleContactsAdapter) -> None:
     """
@@ -234,59 +401,139 @@ async def handle_auth_code(update: Update, context: ContextTypes.DEFAULT_TYPE,
     message_text = update.message.text
     
     # Извлекаем код авторизации из сообщения
+    # Формат команды: /auth_code XXXX; если аргумент не указан, берем код,
+    # ранее сохраненный из свободного сообщения в handle_message
+    match = _AUTH_CODE_RE.match(message_text)
+    auth_code = match.group(1) if match else context.user_data.pop('auth_code', None)
+
+    if not auth_code:
+        await q_reply(update.message,
+            "Пожалуйста, укажите код авторизации после команды, например:\n"
+            "`/auth_code ваш_код_авторизации`"
+        )
+        return
+
     try:
-        # Формат команды: /auth_code XXXX
-        auth_code = message_text.split("/auth_code", 1)[1].strip()
-        
-        if not auth_code:
-            await update.message.reply_text(
-                "Пожалуйста, укажите код авторизации после команды, например:\n"
-                "`/auth_code ваш_код_авторизации`"
-            )
-            return
-        
         # Отправляем сообщение о процессе авторизации
-        progress_message = await update.message.reply_text("Выполняю авторизацию в Google... ⏳")
+        progress_message = await q_reply(update.message,"Выполняю авторизацию в Google... ⏳")
         
         # Авторизуем пользователя с полученным кодом
         result = await google_adapter.authorize_user(user_id, auth_code)
         
         if result["success"]:
-            await progress_message.edit_text(
+            # Сбрасываем кэш проверки авторизации — статус только что изменился
+            context.user_data.pop("_auth_cache", None)
+
+            # Подтверждение и предложение синхронизации — одно редактирование
+            # вместо двух подряд сообщений в тот же чат
+            await q_edit(progress_message,
                 "✅ Авторизация в Google успешно выполнена!\n\n"
-                "Теперь вы можете синхронизировать контакты с помощью команды /sync"
-            )
-            
-            # Предлагаем сразу выполнить синхронизацию
-            keyboard = [
-                [InlineKeyboardButton("Синхронизировать контакты", callback_data="sync_contacts")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
                 "Хотите выполнить синхронизацию контактов сейчас?",
-                reply_markup=reply_markup
+                reply_markup=_markup((("Синхронизировать контакты", "sync_contacts"),))
             )
         else:
-            await progress_message.edit_text(
+            await q_edit(progress_message,
                 f"❌ Ошибка авторизации: {result['message']}\n\n"
                 "Пожалуйста, попробуйте получить новый код авторизации."
             )
             
     except Exception as e:
         logger.error(f"Ошибка при обработке кода авторизации: {e}")
-        await update.message.reply_text(
+        await q_reply(update.message,
             "❌ Произошла ошибка при обработке кода авторизации.\n"
             "Пожалуйста, убедитесь, что вы правильно указали код.\n\n"
             "Формат команды: `/auth_code ваш_код_авторизации`"
         )
 
 
-async def handle_button(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, 
-                       db_manager: DatabaseManager, google_adapter: GoogleContactsAdapter = None, 
+async def _on_help(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE,
+                   db_manager: DatabaseManager, google_adapter: Optional[GoogleContactsAdapter],
+                   sync_manager: Optional[SyncManager]) -> None:
+    """Кнопка help: показывает справку по командам"""
+    await query.answer("Открываю справку...")
+
+    # Текст и клавиатура справки собраны один раз на уровне модуля
+    await q_edit(query.message,
+        text=_HELP_TEXT,
+        reply_markup=_HELP_MARKUP
+    )
+
+
+async def _on_auth_google(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE,
+                          db_manager: DatabaseManager, google_adapter: Optional[GoogleContactsAdapter],
+                          sync_manager: Optional[SyncManager]) -> None:
+    """Кнопка auth_google: запускает авторизацию в Google"""
+    await query.answer("Начинаем авторизацию в Google...")
+
+    if not google_adapter:
+        logger.error("Google адаптер не инициализирован")
+        await q_reply(query.message,
+            "Извините, произошла ошибка при настройке Google API.\n"
+            "Пожалуйста, попробуйте позже или свяжитесь с администратором."
+        )
+        return
+
+    # Проверяем, авторизован ли пользователь
+    is_authorized = await db_manager.is_google_authorized(query.from_user.id)
+
+    if is_authorized:
+        # Если пользователь уже авторизован, предлагаем синхронизацию
+        await q_reply(query.message,
+            "Вы уже авторизованы в Google.\n"
+            "Хотите начать синхронизацию контактов?",
+            reply_markup=_markup((("Синхронизировать", "sync_contacts"),))
+        )
+    else:
+        # Если пользователь не авторизован, отправляем ссылку для
+        # авторизации; URL статичен и закэширован в адаптере
+        auth_url = await google_adapter.get_user_google_auth_url()
+
+        await q_reply(query.message,
+            "Для синхронизации контактов, необходимо авторизоваться в Google.\n\n"
+            "1. Перейдите по ссылке ниже\n"
+            "2. Войдите в свой аккаунт Google и разрешите доступ\n"
+            "3. Скопируйте полученный код авторизации\n"
+            "4. Отправьте код боту с командой /auth_code [ваш_код]\n\n"
+            f"[Авторизоваться в Google]({auth_url})",
+            parse_mode=ParseMode.MARKDOWN,
+            disable_web_page_preview=True
+        )
+
+
+async def _on_about(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE,
+                    db_manager: DatabaseManager, google_adapter: Optional[GoogleContactsAdapter],
+                    sync_manager: Optional[SyncManager]) -> None:
+    """Кнопка about: показывает информацию о проекте"""
+    await query.answer("Информация о проекте")
+
+    await q_edit(query.message,
+        text=_ABOUT_TEXT,
+        reply_markup=_markup((("Назад", "help"),))
+    )
+
+
+async def _on_unknown(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE,
+                      db_manager: DatabaseManager, google_adapter: Optional[GoogleContactsAdapter],
+                      sync_manager: Optional[SyncManager]) -> None:
+    """Нераспознанная кнопка"""
+    await query.answer("Неизвестная команда")
+    logger.warning(f"Получена неизвестная команда кнопки: {query.data}")
+
+
+# Диспетчеризация кнопок по словарю: поиск за O(1) вместо цепочки
+# сравнений, новые кнопки добавляются записью в словарь
+_CALLBACK_HANDLERS = {
+    "help": _on_help,
+    "auth_google": _on_auth_google,
+    "about": _on_about,
+}
+
+
+async def handle_button(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE,
+                       db_manager: DatabaseManager, google_adapter: GoogleContactsAdapter = None,
                        sync_manager: SyncManager = None) -> None:
     """Обработчик нажатий на инлайн-кнопки
-    
+
     Args:
         query: Объект запроса обратного вызова
         context: Контекст бота
@@ -294,127 +541,24 @@ async def handle_button(query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE
         google_adapter: Адаптер для работы с Google Contacts API
         sync_manager: Менеджер синхронизации
     """
-    # Получаем данные из кнопки
-    data = query.data
-    user = query.from_user
-    
+    handler = _CALLBACK_HANDLERS.get(query.data, _on_unknown)
+
     try:
-        # Обрабатываем разные типы кнопок
-        if data == "help":
-            # Отвечаем на нажатие кнопки
-            await query.answer("Открываю справку...")
-            
-            # Формируем сообщение справки
-            help_text = (
-                "📱 NetWorkGPT - ваш помощник для управления контактами.\n\n"
-                "Доступные команды:\n"
-                "/start - Начать работу с ботом\n"
-                "/help - Показать эту справку\n"
-                "/sync - Синхронизировать контакты с Google\n"
-                "/contact [имя] - Поиск информации о контакте\n"
-                "/add_note [имя] [текст] - Добавить заметку к контакту\n"
-                "/add_social [имя] [тип] [ссылка] - Добавить ссылку на соцсеть\n"
-                "/auth_code [код] - Ввести код авторизации Google\n\n"
-                "Для начала работы, синхронизируйте ваши контакты с Google."
-            )
-            
-            # Формируем кнопки
-            keyboard = [
-                [InlineKeyboardButton("Синхронизировать с Google", callback_data="auth_google")],
-                [InlineKeyboardButton("О проекте", callback_data="about")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Редактируем исходное сообщение
-            await query.edit_message_text(
-                text=help_text,
-                reply_markup=reply_markup
-            )
-            
-        elif data == "auth_google":
-            # Отвечаем на нажатие кнопки
-            await query.answer("Начинаем авторизацию в Google...")
-            
-            if not google_adapter:
-                logger.error("Google адаптер не инициализирован")
-                await query.message.reply_text(
-                    "Извините, произошла ошибка при настройке Google API.\n"
-                    "Пожалуйста, попробуйте позже или свяжитесь с администратором."
-                )
-                return
-            
-            # Проверяем, авторизован ли пользователь
-            is_authorized = await db_manager.is_google_authorized(user.id)
-            
-            if is_authorized:
-                # Если пользователь уже авторизован, предлагаем синхронизацию
-                await query.message.reply_text(
-                    "Вы уже авторизованы в Google.\n"
-                    "Хотите начать синхронизацию контактов?",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("Синхронизировать", callback_data="sync_contacts")]
-                    ])
-                )
-            else:
-                # Если пользователь не авторизован, отправляем ссылку для авторизации
-                auth_url = google_adapter.google_api.get_auth_url()
-                
-                await query.message.reply_text(
-                    "Для синхронизации контактов, необходимо авторизоваться в Google.\n\n"
-                    "1. Перейдите по ссылке ниже\n"
-                    "2. Войдите в свой аккаунт Google и разрешите доступ\n"
-                    "3. Скопируйте полученный код авторизации\n"
-                    "4. Отправьте код боту с командой /auth_code [ваш_код]\n\n"
-                    f"[Авторизоваться в Google]({auth_url})",
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True
-                )
-        
-        elif data == "about":
-            # Отвечаем на нажатие кнопки
-            await query.answer("Информация о проекте")
-            
-            about_text = (
-                "🤖 NetWorkGPT\n\n"
-                "Умный бот для управления контактами с интеграцией Google Contacts "
-                "и аналитикой на базе ИИ.\n\n"
-                "📊 Возможности:\n"
-                "• Синхронизация контактов с Google\n"
-                "• Умный поиск по контактам\n"
-                "• Добавление заметок и связей\n"
-                "• Аналитика вашей сети контактов\n\n"
-                "👨‍💻 Разработчики: Сергей Дышкант, Андрианов Вячеслав\n"
-                "🌐 Версия: 1.0"
-            )
-            
-            await query.edit_message_text(
-                text=about_text,
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("Назад", callback_data="help")]
-                ])
-            )
-        
-        else:
-            # Если кнопка не распознана
-            await query.answer("Неизвестная команда")
-            logger.warning(f"Получена неизвестная команда кнопки: {data}")
-    
+        await handler(query, context, db_manager, google_adapter, sync_manager)
     except Exception as e:
         logger.error(f"Ошибка при обработке нажатия кнопки: {e}")
         await query.answer("Произошла ошибка при обработке запроса")
-        
+
         # Уведомляем пользователя об ошибке
         try:
-            await query.message.reply_text(
-                "Извините, произошла ошибка при обработке вашего запроса.\n"
-                "Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
-            )
+            await q_reply(query.message, _ERROR_TEXT)
         except Exception:
             pass  # Игнорируем ошибки при отправке сообщения об ошибке
 
 
 # Обработчики новых команд
 
+@safe_handler
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE, db_manager: DatabaseManager) -> None:
     """
     Обработчик текстовых сообщений
@@ -429,62 +573,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE, db_
     logger.info(f"Получено текстовое сообщение от {user.id}: {message_text}")
     
     # Проверяем, является ли сообщение кодом авторизации Google OAuth
-    if message_text.startswith('4/') and '/' in message_text and len(message_text) > 20:
+    if _OAUTH_CODE_RE.match(message_text):
         # Это код авторизации Google
-        await update.message.reply_text(
-            f"Я получил код авторизации Google. Пожалуйста, используйте команду /auth_code, чтобы ввести код: \n`{message_text[:10]}...`"
+        await q_reply(update.message,
+            _AUTH_ACK_TMPL.format(code_preview=message_text[:10])
         )
         context.user_data['auth_code'] = message_text
     else:
         # Другое текстовое сообщение
-        await update.message.reply_text(
+        await q_reply(update.message,
             f"Привет, {user.first_name}! Я пока не могу обработать ваше сообщение. Используйте команды /help для получения списка доступных команд.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("Помощь", callback_data="help")]
-            ])
+            reply_markup=_markup((("Помощь", "help"),))
         )
 
-async def handle_auth_code(update: Update, context: ContextTypes.DEFAULT_TYPE, sync_manager: SyncManager) -> None:
-    """
-    Обработчик команды /auth_code - обработка кода авторизации Google
-    
-    Args:
-        update: Объект обновления Telegram
-        context: Контекст бота
-        sync_manager: Менеджер синхронизации
-    """
-    user = update.effective_user
-    logger.info(f"Пользователь {user.id} запросил обработку кода авторизации")
-    
-    # Проверяем, есть ли в контексте сохраненный код авторизации
-    auth_code = context.user_data.get('auth_code')
-    
-    if not auth_code:
-        # Нет сохраненного кода авторизации
-        await update.message.reply_text(
-            "Пожалуйста, введите код авторизации после команды, например:\n"
-            "`/auth_code ваш_код_авторизации`"
-        )
-        return
-    
-    try:
-        # Обрабатываем код авторизации
-        await update.message.reply_text("Выполняю авторизацию в Google...")
-        # Вызываем метод обмена кода на токены
-        result = await sync_manager.exchange_auth_code(auth_code, user.id)
-        
-        await update.message.reply_text(
-            f"Код авторизации принят! Авторизация в Google успешно выполнена."
-        )
-        # Очищаем сохраненный код авторизации
-        del context.user_data['auth_code']
-    except Exception as e:
-        logger.error(f"Ошибка при обработке кода авторизации: {e}")
-        await update.message.reply_text(
-            f"Произошла ошибка при обработке кода авторизации: {str(e)}"
-        )
-
-
+@safe_handler
 async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE, db_manager: DatabaseManager):
     """
     Обработчик команды /contact - управление контактами
@@ -498,14 +600,13 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE, db_
     logger.info(f"Пользователь {user.id} запросил управление контактами")
     
     # Временный ответ, пока функция не реализована
-    await update.message.reply_text(
+    await q_reply(update.message,
         f"Привет, {user.first_name}! Команда /contact пока в разработке.\n\n"
         "Здесь будет реализовано управление контактами.",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("Помощь", callback_data="help")]
-        ])
+        reply_markup=_markup((("Помощь", "help"),))
     )
 
+@safe_handler
 async def handle_add_note(update: Update, context: ContextTypes.DEFAULT_TYPE, db_manager: DatabaseManager, sync_manager: SyncManager):
     """
     Обработчик команды /add_note - добавление заметки к контакту
@@ -520,14 +621,13 @@ async def handle_add_note(update: Update, context: ContextTypes.DEFAULT_TYPE, db
     logger.info(f"Пользователь {user.id} запросил добавление заметки")
     
     # Временный ответ, пока функция не реализована
-    await update.message.reply_text(
+    await q_reply(update.message,
         f"Привет, {user.first_name}! Команда /add_note пока в разработке.\n\n"
         "Здесь будет реализовано добавление заметок к контактам.",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("Помощь", callback_data="help")]
-        ])
+        reply_markup=_markup((("Помощь", "help"),))
     )
 
+@safe_handler
 async def handle_add_social(update: Update, context: ContextTypes.DEFAULT_TYPE, db_manager: DatabaseManager, sync_manager: SyncManager):
     """
     Обработчик команды /add_social - добавление ссылки на соцсеть
@@ -542,12 +642,10 @@ async def handle_add_social(update: Update, context: ContextTypes.DEFAULT_TYPE,
     logger.info(f"Пользователь {user.id} запросил добавление ссылки на соцсеть")
     
     # Временный ответ, пока функция не реализована
-    await update.message.reply_text(
+    await q_reply(update.message,
         f"Привет, {user.first_name}! Команда /add_social пока в разработке.\n\n"
         "Здесь будет реализовано добавление ссылок на соцсети.",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("Помощь", callback_data="help")]
-        ])
+        reply_markup=_markup((("Помощь", "help"),))
     )
 
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ограничитель скорости исходящих сообщений Telegram
+Дозирует отправку под лимиты API (~30 сообщений в секунду на бота,
+1 сообщение в секунду на чат), чтобы бот не получал 429 и не простаивал
+в экспоненциальных паузах retry_after
+
+Авторы: Сергей Дышкант, Андрианов Вячеслав
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from telegram import Message
+from telegram.error import RetryAfter
+
+from loguru import logger
+
+# Порог, после которого карта per-chat дедлайнов чистится от истекших
+# записей, чтобы не расти вместе с числом когда-либо виденных чатов
+_MAX_CHAT_ENTRIES = 1024
+
+
+class TelegramRateLimiter:
+    """Скользящее окно на все отправки бота плюс интервал на каждый чат
+
+    Глобальный лимит держится с запасом ниже потолка Telegram, чтобы
+    оставить бюджет служебным запросам (answer_callback_query и т.п.)
+    """
+
+    def __init__(self, global_rate: int = 25, per_chat_interval: float = 1.0):
+        """
+        Инициализация ограничителя
+
+        Args:
+            global_rate: Максимум сообщений в секунду на всего бота
+            per_chat_interval: Минимальный интервал между сообщениями в один чат
+        """
+        self._global_rate = global_rate
+        self._per_chat_interval = per_chat_interval
+        # Времена последних отправок в пределах глобального окна в 1 секунду
+        self._window: deque = deque()
+        # chat_id -> момент, раньше которого в этот чат отправлять нельзя
+        self._next_by_chat: Dict[int, float] = {}
+        # Момент окончания паузы после полученного от API retry_after
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, chat_id: int) -> None:
+        """Ждет, пока отправка в указанный чат не уложится в лимиты"""
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+
+                # Чистим окно от отправок старше секунды
+                while self._window and now - self._window[0] >= 1.0:
+                    self._window.popleft()
+
+                wait = self._paused_until - now
+                if len(self._window) >= self._global_rate:
+                    wait = max(wait, 1.0 - (now - self._window[0]))
+                wait = max(wait, self._next_by_chat.get(chat_id, 0.0) - now)
+
+                if wait <= 0:
+                    self._window.append(now)
+                    self._next_by_chat[chat_id] = now + self._per_chat_interval
+                    if len(self._next_by_chat) > _MAX_CHAT_ENTRIES:
+                        self._evict_expired(now)
+                    return
+
+            # Спим, отпустив блокировку: секундный интервал одного чата
+            # не должен задерживать отправки во все остальные чаты.
+            # После сна лимиты перепроверяются заново под блокировкой
+            await asyncio.sleep(wait)
+
+    def _evict_expired(self, now: float) -> None:
+        """Убирает из карты чаты, чей интервал ожидания уже истек
+
+        Args:
+            now: Текущее монотонное время
+        """
+        expired = [chat_id for chat_id, deadline in self._next_by_chat.items()
+                   if deadline <= now]
+        for chat_id in expired:
+            del self._next_by_chat[chat_id]
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает все отправки на указанное время (после 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+# Общий ограничитель на процесс бота
+_limiter = TelegramRateLimiter()
+
+
+async def _dispatch(chat_id: int, send: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """Выполняет отправку под лимитером с одной повторной попыткой на 429"""
+    await _limiter.acquire(chat_id)
+    try:
+        return await send(*args, **kwargs)
+    except RetryAfter as e:
+        # Телеграм все же попросил подождать — тормозим все отправки
+        # на указанное время и повторяем один раз
+        logger.warning(f"Получен retry_after={e.retry_after} от Telegram, приостанавливаем отправку")
+        _limiter.pause(e.retry_after)
+        await asyncio.sleep(e.retry_after)
+        return await send(*args, **kwargs)
+
+
+async def q_send(bot, chat_id: int, text: str, **kwargs) -> Message:
+    """Отправляет сообщение в чат с учетом лимитов Telegram"""
+    return await _dispatch(chat_id, bot.send_message, chat_id=chat_id, text=text, **kwargs)
+
+
+async def q_reply(message: Message, text: str, **kwargs) -> Message:
+    """Отвечает на сообщение с учетом лимитов Telegram"""
+    return await _dispatch(message.chat_id, message.reply_text, text, **kwargs)
+
+
+async def q_reply_html(message: Message, text: str, **kwargs) -> Message:
+    """Отвечает на сообщение в HTML-разметке с учетом лимитов Telegram"""
+    return await _dispatch(message.chat_id, message.reply_html, text, **kwargs)
+
+
+async def q_reply_markdown(message: Message, text: str, **kwargs) -> Message:
+    """Отвечает на сообщение в Markdown-разметке с учетом лимитов Telegram"""
+    return await _dispatch(message.chat_id, message.reply_markdown, text, **kwargs)
+
+
+async def q_edit(message: Message, text: str, **kwargs) -> Message:
+    """Редактирует сообщение с учетом лимитов Telegram"""
+    return await _dispatch(message.chat_id, message.edit_text, text, **kwargs)
@@ -12,9 +12,11 @@ import asyncio
 from typing import Dict, Any, Optional, List
 import logging
 
+import orjson
 from telegram import Update, Bot, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler
 from telegram.ext import filters, ContextTypes
+from telegram.request import HTTPXRequest
 
 from loguru import logger
 
@@ -27,6 +29,17 @@ from src.api.google_api import GoogleContactsAPI
 from src.api.google_contacts_adapter import GoogleContactsAdapter
 
 
+class ORJSONRequest(HTTPXRequest):
+    """HTTP-транспорт PTB с разбором ответов API через orjson
+
+    Каждый ответ Telegram (включая пачки обновлений при long polling)
+    декодируется C-реализацией orjson вместо стандартного json
+    """
+
+    def parse_json_payload(self, payload: bytes) -> Dict[str, Any]:
+        return orjson.loads(payload)
+
+
 class TelegramBot:
     """Класс для управления Telegram ботом и обработки команд"""
 
@@ -44,8 +57,15 @@ class TelegramBot:
         self.token = config['api_keys']['telegram_token']
         self.welcome_message = config['bot']['welcome_message']
         self.admin_ids = set(config['bot']['admin_ids'])
+        # Чат для служебных уведомлений задается конфигурацией —
+        # каждая копия бота может иметь свой канал администратора
+        self.admin_chat_id = config['bot'].get('admin_chat_id')
         self.application = None
         self.is_running = False
+        # Сильные ссылки на фоновые задачи: цикл событий хранит только
+        # слабые ссылки, и задача без владельца может быть собрана GC
+        # посреди выполнения
+        self._bg_tasks: set = set()
         
         # Создаем экземпляр Google API и адаптера
         self.google_api = GoogleContactsAPI(config)
@@ -54,8 +74,28 @@ class TelegramBot:
     async def start(self) -> None:
         """Запуск бота и регистрация обработчиков команд"""
         try:
-            # Создаем экземпляр приложения
-            self.application = Application.builder().token(self.token).build()
+            # Создаем экземпляр приложения; отдельный транспорт для
+            # get_updates — так же, как это делает сам PTB по умолчанию.
+            # Увеличенный пул и HTTP/2 позволяют параллельным запросам
+            # (рассылки администраторам, правки прогресса синхронизации)
+            # мультиплексироваться в одном TLS-соединении вместо
+            # рукопожатия на каждый запрос
+            self.application = (
+                Application.builder()
+                .token(self.token)
+                .request(ORJSONRequest(
+                    connection_pool_size=64,
+                    http_version="2",
+                    read_timeout=35,
+                    connect_timeout=10
+                ))
+                .get_updates_request(ORJSONRequest(
+                    http_version="2",
+                    read_timeout=35,
+                    connect_timeout=10
+                ))
+                .build()
+            )
             
             # Регистрируем обработчики команд
             self._register_handlers()
@@ -64,8 +104,40 @@ class TelegramBot:
             logger.info("Запуск Telegram бота...")
             await self.application.initialize()
             await self.application.start()
-            await self.application.updater.start_polling()
+
+            # При заданном webhook_url Telegram сам доставляет обновления
+            # HTTPS-запросами — без постоянных опросов getUpdates;
+            # без него остается polling для локальной разработки
+            webhook_url = self.config['bot'].get('webhook_url')
+            if webhook_url:
+                port = int(self.config['bot'].get('webhook_port', 8443))
+                await self.application.updater.start_webhook(
+                    listen="0.0.0.0",
+                    port=port,
+                    url_path=self.token,
+                    webhook_url=f"{webhook_url.rstrip('/')}/{self.token}",
+                    allowed_updates=["message", "callback_query"]
+                )
+                logger.info(f"Обновления принимаются через webhook на порту {port}")
+            else:
+                # Длинный опрос: один HTTP-запрос покрывает до 30 секунд
+                # простоя вместо частых пустых обращений, а allowed_updates
+                # отсекает типы обновлений, которые бот не обрабатывает
+                await self.application.updater.start_polling(
+                    timeout=30,
+                    poll_interval=0.0,
+                    bootstrap_retries=-1,
+                    allowed_updates=["message", "callback_query"]
+                )
             
+            # Запускаем фоновую задачу пакетных уведомлений администратору,
+            # если в конфигурации указан чат для них
+            if self.admin_chat_id:
+                self.application.bot_data["admin_chat_id"] = self.admin_chat_id
+                self.application.create_task(
+                    handlers.admin_notifications_worker(self.application.bot, self.admin_chat_id)
+                )
+
             self.is_running = True
             logger.info("Telegram бот успешно запущен!")
             
@@ -81,6 +153,23 @@ class TelegramBot:
             logger.exception(f"Ошибка при запуске Telegram бота: {e}")
             raise
 
+    def _spawn(self, coro) -> asyncio.Task:
+        """Запускает корутину фоновой задачей, не теряя ссылку на нее
+
+        Задача хранится в _bg_tasks до завершения, поэтому не может быть
+        собрана сборщиком мусора посреди выполнения и молча потеряна
+
+        Args:
+            coro: Корутина для выполнения в фоне
+
+        Returns:
+            Созданная задача
+        """
+        task = asyncio.get_running_loop().create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
     def _register_handlers(self) -> None:
         """Регистрирует все обработчики команд и сообщений"""
         # Основные команды
@@ -141,12 +230,14 @@ class TelegramBot:
         
         # Обрабатываем кнопку синхронизации
         if query_data == "sync_contacts":
-            # Отправляем команду /sync для обработки
+            # Отвечаем на callback сразу и уводим длительную синхронизацию
+            # в фоновую задачу: спиннер у пользователя гаснет мгновенно,
+            # а 15-секундный лимит ответа Telegram никогда не нарушается
             await query.answer("Запускаем синхронизацию...")
-            await self._handle_sync(update, context)
+            self._spawn(self._handle_sync(update, context))
         else:
             # Передаем обработку другим кнопкам
-            await handlers.handle_button(query, context, self.db_manager, self.sync_manager, self.google_adapter)
+            await handlers.handle_button(query, context, self.db_manager, self.google_adapter, self.sync_manager)
     
     async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработчик текстовых сообщений"""
@@ -156,20 +247,24 @@ class TelegramBot:
         """Обработчик ошибок"""
         logger.error(f"Произошла ошибка: {context.error} в запросе {update}")
         
-        # Отправляем сообщение об ошибке пользователю
+        # Ответ пользователю и уведомления администраторам отправляются
+        # одним gather: общее время равно самому медленному запросу,
+        # а не сумме последовательных обращений к API
         if update and update.effective_chat:
-            await update.effective_chat.send_message(
+            sends = [update.effective_chat.send_message(
                 "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
-            )
-            
-            # Отправляем уведомление администраторам 
+            )]
+
             if self.admin_ids:
-                for admin_id in self.admin_ids:
-                    try:
-                        user_info = f"ID: {update.effective_user.id}, Username: @{update.effective_user.username}"
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"ОШИБКА В БОТЕ:\n{context.error}\n\nПользователь: {user_info}\nЗапрос: {update.message and update.message.text}"
-                        )
-                    except Exception as e:
-                        logger.error(f"Не удалось отправить уведомление админу {admin_id}: {e}")
+                # Текст уведомления одинаков для всех админов — собираем его один раз
+                user_info = f"ID: {update.effective_user.id}, Username: @{update.effective_user.username}"
+                admin_text = f"ОШИБКА В БОТЕ:\n{context.error}\n\nПользователь: {user_info}\nЗапрос: {update.message and update.message.text}"
+                sends.extend(
+                    context.bot.send_message(chat_id=admin_id, text=admin_text)
+                    for admin_id in self.admin_ids
+                )
+
+            results = await asyncio.gather(*sends, return_exceptions=True)
+            for chat_id, result in zip([update.effective_chat.id, *self.admin_ids], results):
+                if isinstance(result, Exception):
+                    logger.error(f"Не удалось отправить уведомление в чат {chat_id}: {result}")
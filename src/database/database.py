@@ -1,12 +1,13 @@
 import json
-from typing import Dict, Any, Optional, List, Union, Tuple
-import asyncio
-from datetime import datetime, timedelta
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Set, Union, Tuple
+from datetime import datetime, timedelta, timezone
 from contextlib import asynccontextmanager
 
-from sqlalchemy import create_engine, and_, or_, func
+from sqlalchemy import and_, or_, func, insert, update, event, bindparam, lambda_stmt, inspect
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from sqlalchemy.orm import sessionmaker, scoped_session, Session, selectinload
 from sqlalchemy.future import select
 from sqlalchemy.sql import text
 
@@ -15,49 +16,83 @@ from loguru import logger
 # Исправлены относительные импорты на абсолютные
 from src.database.models import Base, User, Contact, SocialLink, Tag, Group, SyncLog
 
+# Параметры внутрипроцессного кэша пользователей: запись живет не дольше
+# TTL секунд, а размер ограничен, чтобы кэш не рос безгранично
+_USER_CACHE_TTL = 60.0
+_USER_CACHE_SIZE = 10000
+
+
+# PRAGMA-настройки SQLite, применяемые к каждому новому соединению:
+# WAL и synchronous=NORMAL убирают двойной fsync на каждый COMMIT,
+# mmap и увеличенный кэш страниц ускоряют чтение, busy_timeout дает
+# конкурирующим писателям подождать вместо немедленной ошибки
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000"
+)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Выполняет PRAGMA-настройки на свежем соединении SQLite
+
+    Args:
+        dbapi_connection: Низкоуровневое соединение DBAPI
+        connection_record: Служебная запись пула соединений
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# Предсобранные лямбда-выражения самых горячих запросов: SQLAlchemy
+# не строит дерево select(...) заново на каждый вызов, а переиспользует
+# разобранную и скомпилированную форму по идентичности лямбды
+_USER_BY_TELEGRAM_ID = lambda_stmt(
+    lambda: select(User).where(User.telegram_id == bindparam("tid"))
+)
+_USER_ID_BY_TELEGRAM_ID = lambda_stmt(
+    lambda: select(User.id).where(User.telegram_id == bindparam("tid")).limit(1)
+)
+_CONTACT_BY_USER_AND_GOOGLE_ID = lambda_stmt(
+    lambda: select(Contact).where(
+        and_(
+            Contact.user_id == bindparam("uid"),
+            Contact.google_id == bindparam("gid")
+        )
+    )
+)
 
-# Класс-обертка для использования синхронной сессии SQLite в асинхронном режиме
-class AsyncSQLiteSession:
-    """Обертка для использования синхронной сессии SQLite с async with"""
-    
-    def __init__(self, session):
-        self.session = session
-    
-    async def __aenter__(self):
-        return self.session
-    
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if exc_type is not None:
-            self.session.rollback()
-        else:
-            await asyncio.to_thread(self.session.commit)
-        self.session.close()
-    
-    async def execute(self, query):
-        result = await asyncio.to_thread(self.session.execute, query)
-        return result
-    
-    async def commit(self):
-        await asyncio.to_thread(self.session.commit)
-    
-    async def rollback(self):
-        await asyncio.to_thread(self.session.rollback)
-    
-    async def close(self):
-        await asyncio.to_thread(self.session.close)
-    
-    async def get(self, model, instance_id):
-        # Эмуляция async метода get
-        result = await asyncio.to_thread(lambda: self.session.get(model, instance_id))
-        return result
-    
-    async def add(self, instance):
-        # Эмуляция async метода add
-        self.session.add(instance)
-    
-    async def refresh(self, instance):
-        # Эмуляция async метода refresh
-        await asyncio.to_thread(self.session.refresh, instance)
+
+def _utcnow_naive() -> datetime:
+    """Текущее время UTC без tzinfo для сравнения с naive-колонками БД
+
+    Returns:
+        Момент времени UTC, снятый с aware-часов (datetime.utcnow
+        объявлен устаревшим), с отброшенным tzinfo
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass(slots=True, frozen=True)
+class UserDTO:
+    """Неизменяемый снимок записи пользователя
+
+    Слотированный датакласс дешевле словаря и не привязан к сессии БД;
+    сериализация (isoformat и т.п.) выполняется на внешней границе,
+    а не при каждой внутренней передаче
+    """
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    is_active: bool
+    created_at: Optional[datetime]
 
 
 class DatabaseManager:
@@ -72,32 +107,144 @@ class DatabaseManager:
         """
         self.db_url = db_url
         self.is_sqlite = 'sqlite' in db_url.lower()
-        
-        # Создаем общий движок SQLAlchemy для SQLite и PostgreSQL
+
+        # Кэш горячих записей пользователей: telegram_id -> (срок, User).
+        # Каждое обновление Telegram порождает один-два запроса get_user
+        # по одному и тому же пользователю — кэш снимает эти обращения к БД
+        self._user_cache: Dict[int, Tuple[float, User]] = {}
+        # Кэш результата проверки авторизации Google: telegram_id ->
+        # (срок, bool). Ответ меняется только при обновлении токена,
+        # поэтому промежуточные проверки не должны ходить в БД
+        self._auth_cache: Dict[int, Tuple[float, bool]] = {}
+
+
+        # Единый асинхронный движок для обоих бэкендов: SQLite работает
+        # через aiosqlite, PostgreSQL — через asyncpg. Пул соединений
+        # настраивается явно: каждая сессия обработчика берет готовое
+        # соединение вместо установки нового на каждый запрос
         if self.is_sqlite:
-            # Для SQLite используем синхронный движок
-            self.engine = create_engine(self.db_url, echo=False)
-            self.session_factory = sessionmaker(bind=self.engine, expire_on_commit=False)
+            # aiosqlite держит по одному фоновому потоку на соединение,
+            # поэтому прыжок в пул потоков на каждую операцию не нужен
+            if '+aiosqlite' not in db_url:
+                self.async_db_url = db_url.replace('sqlite://', 'sqlite+aiosqlite://')
+            else:
+                self.async_db_url = db_url
+            connect_args = {}
         else:
-            # Для PostgreSQL используем асинхронный движок
             if not db_url.startswith('postgresql+asyncpg'):
                 self.async_db_url = db_url.replace('postgresql://', 'postgresql+asyncpg://')
             else:
                 self.async_db_url = db_url
-            self.engine = create_async_engine(self.async_db_url, echo=False)
-            self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
-    
-    async def initialize(self) -> None:
-        """Инициализация базы данных - создание таблиц, если они не существуют"""
+            # Кэш подготовленных выражений asyncpg: повторяющиеся
+            # параметризованные запросы (get_user и т.п.) Postgres
+            # разбирает и планирует один раз на соединение; JIT для
+            # коротких OLTP-запросов только добавляет накладные расходы
+            connect_args = {
+                "prepared_statement_cache_size": 1024,
+                "server_settings": {"jit": "off"}
+            }
+
+        # pool_pre_ping отбрасывает соединения, умершие на стороне
+        # сервера (перезапуск Postgres, таймаут), до передачи обработчику,
+        # а pool_recycle не дает соединению жить дольше получаса
+        self.engine = create_async_engine(
+            self.async_db_url,
+            echo=False,
+            pool_size=5,
+            max_overflow=20,
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            connect_args=connect_args
+        )
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
         if self.is_sqlite:
-            # Для SQLite используем синхронный метод создания таблиц
-            Base.metadata.create_all(self.engine)
-        else:
-            # Для PostgreSQL используем асинхронный метод создания таблиц
-            async with self.engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-        
+            # Настройки применяются на событии connect — один раз на
+            # соединение пула, а не на каждую сессию
+            event.listen(self.engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+    async def initialize(self) -> None:
+        """Инициализация базы данных - создание таблиц и доведение схемы
+
+        create_all создает только отсутствующие таблицы и не изменяет
+        существующие, поэтому следом выполняется аддитивный проход:
+        в уже созданные таблицы добавляются недостающие колонки и индексы
+        """
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(self._apply_additive_migrations)
+
         logger.info("База данных инициализирована")
+
+    @staticmethod
+    def _apply_additive_migrations(connection) -> None:
+        """Добавляет в существующие таблицы недостающие колонки и индексы
+
+        Покрывает безопасные аддитивные изменения схемы между версиями
+        (новые nullable-колонки вроде contacts.payload_hash, новые
+        индексы вроде уникального (user_id, google_id)) без полноценного
+        инструмента миграций. Несовместимые изменения по-прежнему
+        требуют ручного вмешательства
+
+        Args:
+            connection: Синхронное соединение внутри run_sync
+        """
+        inspector = inspect(connection)
+        dialect = connection.dialect
+
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} "
+                    f"ADD COLUMN {column.name} {column.type.compile(dialect)}"
+                ))
+                logger.info(f"Добавлена колонка {table.name}.{column.name}")
+
+            existing_indexes = {idx["name"] for idx in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection, checkfirst=True)
+                    logger.info(f"Создан индекс {index.name} на таблице {table.name}")
+
+    async def verify_schema(self) -> None:
+        """Быстрая проверка, что схема базы данных актуальна
+
+        Зондирующие запросы вместо полного обхода метаданных в
+        create_all: помимо существования базовой таблицы проверяются
+        колонки, добавленные после первых релизов, — устаревшая схема
+        останавливает запуск с понятным действием, а не падает позже
+        посреди синхронизации
+
+        Raises:
+            RuntimeError: Если схема не создана или устарела
+                (нужен запуск с --migrate)
+        """
+        probes = (
+            "SELECT 1 FROM users LIMIT 1",
+            # Колонки и таблицы, появившиеся после первых релизов
+            "SELECT payload_hash FROM contacts LIMIT 1",
+            "SELECT skipped_contacts FROM sync_logs LIMIT 1",
+        )
+        try:
+            async with self.engine.connect() as conn:
+                for probe in probes:
+                    await conn.execute(text(probe))
+        except Exception as e:
+            raise RuntimeError(
+                "Схема базы данных не инициализирована или устарела. "
+                "Запустите приложение с флагом --migrate"
+            ) from e
+
+    async def close(self) -> None:
+        """Закрывает пул соединений при остановке приложения"""
+        await self.engine.dispose()
+        logger.info("Пул соединений с базой данных закрыт")
     
     @asynccontextmanager
     async def get_session(self):
@@ -111,284 +258,665 @@ class DatabaseManager:
             result = await session.execute(query)
         ```
         """
-        if self.is_sqlite:
-            # Для SQLite создаем обертку для синхронной сессии
-            session = AsyncSQLiteSession(self.session_factory())
-            try:
-                yield session
-            finally:
-                await session.close()
-        else:
-            # Для PostgreSQL используем стандартную асинхронную сессию
-            async_session = self.session_factory()
-            try:
-                yield async_session
-            finally:
-                await async_session.close()
+        session = self.session_factory()
+        try:
+            yield session
+        finally:
+            await session.close()
     
-    async def user_exists(self, telegram_id: int) -> bool:
+    @asynccontextmanager
+    async def _session_scope(self, session=None):
+        """Использует переданную сессию или открывает новую
+
+        Позволяет вызывающему коду выполнить серию запросов в одной
+        сессии (одно соединение из пула) вместо открытия новой на каждый
+        вызов метода
+
+        Args:
+            session: Уже открытая сессия или None
+        """
+        if session is not None:
+            yield session
+        else:
+            async with self.get_session() as new_session:
+                yield new_session
+
+    async def user_exists(self, telegram_id: int, session=None) -> bool:
         """Проверяет, существует ли пользователь с указанным Telegram ID
-        
+
         Args:
             telegram_id: ID пользователя в Telegram
-            
+            session: Уже открытая сессия БД (опционально)
+
         Returns:
             True, если пользователь существует, иначе False
         """
-        async with self.get_session() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
+        async with self._session_scope(session) as session:
+            # Скалярный запрос по индексированному telegram_id: из БД
+            # передается только id вместо материализации всей строки
+            user_id = await session.scalar(
+                _USER_ID_BY_TELEGRAM_ID, {"tid": telegram_id}
             )
-            user = result.scalars().first()
-            return user is not None
+            return user_id is not None
     
-    async def add_user(self, telegram_id: int, username: Optional[str], 
-                     first_name: Optional[str], last_name: Optional[str]) -> Dict[str, Any]:
+    async def add_user(self, telegram_id: int, username: Optional[str],
+                     first_name: Optional[str], last_name: Optional[str]) -> UserDTO:
         """Добавляет нового пользователя в базу данных
-        
+
         Args:
             telegram_id: ID пользователя в Telegram
             username: Имя пользователя в Telegram
             first_name: Имя пользователя
             last_name: Фамилия пользователя
-            
+
         Returns:
-            Словарь с данными пользователя вместо объекта модели
+            Снимок созданного пользователя (UserDTO) вместо объекта модели
         """
         new_user = User(
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
             last_name=last_name,
-            is_active=True,
-            created_at=datetime.utcnow()
+            is_active=True
         )
-        
+
         async with self.get_session() as session:
-            # Добавляем пользователя в сессию
-            await session.add(new_user)
+            # Добавляем пользователя в сессию; присвоенный ID появляется
+            # на объекте уже при фиксации, дополнительный SELECT не нужен
+            session.add(new_user)
             await session.commit()
-            
-            # Получаем свежие данные
-            if self.is_sqlite:
-                # Для SQLite используем другой подход, чтобы избежать проблем с отсоединенными объектами
-                result = await session.execute(
-                    select(User).where(User.telegram_id == telegram_id)
+            db_user = new_user
+
+
+            # Снимаем значения с объекта, чтобы не привязывать вызывающий
+            # код к сессии БД
+            user_dto = UserDTO(
+                id=db_user.id,
+                telegram_id=db_user.telegram_id,
+                username=db_user.username,
+                first_name=db_user.first_name,
+                last_name=db_user.last_name,
+                is_active=db_user.is_active,
+                created_at=db_user.created_at
+            )
+
+            logger.info(f"Добавлен новый пользователь: {telegram_id}, {username}")
+            return user_dto
+    
+    async def upsert_user(self, telegram_id: int, username: Optional[str],
+                          first_name: Optional[str], last_name: Optional[str]) -> Dict[str, Any]:
+        """Создает пользователя или обновляет его профиль одним обращением
+
+        Заменяет связку user_exists + add_user / update_user в горячем
+        обработчике /start: одна сессия, один SELECT и один COMMIT вместо
+        двух последовательных обращений к БД
+
+        Args:
+            telegram_id: ID пользователя в Telegram
+            username: Имя пользователя в Telegram
+            first_name: Имя пользователя
+            last_name: Фамилия пользователя
+
+        Returns:
+            Словарь с данными пользователя и флагом created
+        """
+        async with self.get_session() as session:
+            user = await session.scalar(
+                _USER_BY_TELEGRAM_ID, {"tid": telegram_id}
+            )
+            created = user is None
+
+            if created:
+                user = User(
+                    telegram_id=telegram_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    is_active=True
                 )
-                db_user = result.scalars().first()
+                session.add(user)
+                logger.info(f"Добавлен новый пользователь: {telegram_id}, {username}")
             else:
-                # Для PostgreSQL можем использовать refresh
-                await session.refresh(new_user)
-                db_user = new_user
-            
-            if db_user is None:
-                logger.error(f"Не удалось добавить пользователя: {telegram_id}")
-                return None
-                
-            # Преобразуем объект в словарь, чтобы избежать проблем с сессиями
-            user_dict = {
-                'id': db_user.id,
-                'telegram_id': db_user.telegram_id,
-                'username': db_user.username,
-                'first_name': db_user.first_name,
-                'last_name': db_user.last_name,
-                'is_active': db_user.is_active,
-                'created_at': db_user.created_at.isoformat() if db_user.created_at else None
+                user.username = username
+                user.first_name = first_name
+                user.last_name = last_name
+
+            # Присвоенный ID попадает на объект при фиксации, поэтому
+            # повторный SELECT после вставки не требуется
+            await session.commit()
+
+            self._invalidate_user(telegram_id)
+            return {
+                "id": user.id,
+                "telegram_id": user.telegram_id,
+                "created": created
             }
-            
-            logger.info(f"Добавлен новый пользователь: {telegram_id}, {username}")
-            return user_dict
-    
-    async def get_user(self, telegram_id: int) -> Optional[User]:
+
+    def _cache_user(self, telegram_id: int, user: User) -> None:
+        """Кладет пользователя в кэш с ограничением размера
+
+        Args:
+            telegram_id: ID пользователя в Telegram
+            user: Объект пользователя
+        """
+        if len(self._user_cache) >= _USER_CACHE_SIZE:
+            # Вытесняем самую старую запись (словарь хранит порядок вставки)
+            del self._user_cache[next(iter(self._user_cache))]
+        self._user_cache[telegram_id] = (time.monotonic() + _USER_CACHE_TTL, user)
+
+    def _invalidate_user(self, telegram_id: int) -> None:
+        """Удаляет пользователя из кэшей после изменения его записи
+
+        Args:
+            telegram_id: ID пользователя в Telegram
+        """
+        self._user_cache.pop(telegram_id, None)
+        self._auth_cache.pop(telegram_id, None)
+
+    async def get_user(self, telegram_id: int, session=None) -> Optional[User]:
         """Получает пользователя по его Telegram ID
-        
+
+        Повторные запросы в пределах TTL обслуживаются из кэша процесса
+        без обращения к БД; любые методы записи сбрасывают запись кэша
+
         Args:
             telegram_id: ID пользователя в Telegram
-            
+            session: Уже открытая сессия БД (опционально)
+
         Returns:
             Объект пользователя или None, если пользователь не найден
         """
-        async with self.get_session() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
+        cached = self._user_cache.get(telegram_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        async with self._session_scope(session) as session:
+            user = await session.scalar(
+                _USER_BY_TELEGRAM_ID, {"tid": telegram_id}
             )
-            return result.scalars().first()
+
+        if user is not None:
+            self._cache_user(telegram_id, user)
+        return user
     
-    async def update_user(self, telegram_id: int, **kwargs) -> Optional[User]:
-        """Обновляет информацию о пользователе
-        
+    async def update_user(self, telegram_id: int, **kwargs) -> bool:
+        """Обновляет информацию о пользователе одним UPDATE
+
+        Вместо пары SELECT + UPDATE выполняется единственный UPDATE по
+        индексированному telegram_id; существование записи определяется
+        по числу затронутых строк
+
         Args:
             telegram_id: ID пользователя в Telegram
-            **kwargs: Поля для обновления
-            
+            **kwargs: Поля для обновления (имена вне колонок модели игнорируются)
+
         Returns:
-            Обновленный объект пользователя или None, если пользователь не найден
+            True, если пользователь найден и обновлен, иначе False
         """
+        columns = User.__table__.columns.keys()
+        values = {key: value for key, value in kwargs.items() if key in columns}
+        if not values:
+            return False
+
         async with self.get_session() as session:
             result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
+                update(User).where(User.telegram_id == telegram_id).values(**values)
             )
-            user = result.scalars().first()
-            
-            if user:
-                for key, value in kwargs.items():
-                    if hasattr(user, key):
-                        setattr(user, key, value)
-                
-                user.updated_at = datetime.utcnow()
-                await session.commit()
-                await session.refresh(user)
-                
+            await session.commit()
+
+            self._invalidate_user(telegram_id)
+            if result.rowcount:
                 logger.info(f"Обновлена информация о пользователе: {telegram_id}")
-                return user
-            
-            return None
+                return True
+            return False
     
-    async def is_google_authorized(self, telegram_id: int) -> bool:
+    async def is_google_authorized(self, telegram_id: int, session=None) -> bool:
         """Проверяет, авторизован ли пользователь в Google
-        
+
+        Вместо полной записи пользователя из БД читаются только два
+        нужных столбца; при попадании в кэш запрос не выполняется вовсе
+
         Args:
             telegram_id: ID пользователя в Telegram
-            
+            session: Уже открытая сессия БД (опционально)
+
         Returns:
             True, если у пользователя есть действующий токен Google, иначе False
         """
-        user = await self.get_user(telegram_id)
-        if not user or not user.google_token or not user.token_expiry:
-            return False
-        
-        # Проверяем срок действия токена
-        return user.token_expiry > datetime.utcnow()
+        cached = self._auth_cache.get(telegram_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        async with self._session_scope(session) as session:
+            result = await session.execute(
+                select(User.google_token, User.token_expiry)
+                .where(User.telegram_id == telegram_id)
+            )
+            row = result.first()
+
+        authorized = bool(row and row.google_token and row.token_expiry
+                          and row.token_expiry > _utcnow_naive())
+        self._auth_cache[telegram_id] = (time.monotonic() + _USER_CACHE_TTL, authorized)
+        return authorized
     
-    async def update_google_tokens(self, telegram_id: int, access_token: str, refresh_token: Optional[str] = None, token_expiry: Optional[datetime] = None) -> User:
+    async def update_google_tokens(self, telegram_id: int, access_token: str, refresh_token: Optional[str] = None, token_expiry: Optional[datetime] = None) -> None:
         """
-        Обновляет токены Google для пользователя
-        
+        Обновляет токены Google для пользователя одним UPDATE
+
+        Вместо SELECT пользователя с последующей записью выполняется
+        единственный UPDATE по telegram_id; отсутствие пользователя
+        определяется по числу затронутых строк
+
         Args:
             telegram_id: Telegram ID пользователя
             access_token: Токен доступа Google
             refresh_token: Токен обновления Google (опционально)
             token_expiry: Срок действия токена (опционально)
-            
-        Returns:
-            Обновленный объект пользователя
-            
+
         Raises:
             Exception: Если пользователь не найден
         """
+        values: Dict[str, Any] = {"google_token": access_token}
+        if refresh_token:
+            values["google_refresh_token"] = refresh_token
+        if token_expiry:
+            values["token_expiry"] = token_expiry
+
         async with self.get_session() as session:
-            user = await self.get_user(telegram_id)
-            if not user:
-                raise Exception(f"Пользователь с Telegram ID {telegram_id} не найден")
-            
-            user.google_token = access_token
-            
-            if refresh_token:
-                user.google_refresh_token = refresh_token
-                
-            if token_expiry:
-                user.token_expiry = token_expiry
-                
+            result = await session.execute(
+                update(User).where(User.telegram_id == telegram_id).values(**values)
+            )
             await session.commit()
-            await session.refresh(user)
-            return user
-    
-    async def create_sync_log(self, user_id: int) -> SyncLog:
+
+        self._invalidate_user(telegram_id)
+        if not result.rowcount:
+            raise Exception(f"Пользователь с Telegram ID {telegram_id} не найден")
+
+    async def upsert_user_tokens(self, telegram_id: int, access_token: str,
+                                 refresh_token: Optional[str] = None,
+                                 token_expiry: Optional[datetime] = None) -> None:
+        """
+        Создает пользователя с токенами Google или обновляет их одним запросом
+
+        INSERT ... ON CONFLICT(telegram_id) DO UPDATE вместо пары
+        «прочитать пользователя, затем вставить или обновить»: один
+        обмен с БД и отсутствие гонки read-modify-write
+
+        Args:
+            telegram_id: ID пользователя в Telegram
+            access_token: Новый токен доступа
+            refresh_token: Новый refresh токен (опционально)
+            token_expiry: Время истечения токена (опционально)
+        """
+        if self.is_sqlite:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        values = {
+            'telegram_id': telegram_id,
+            'google_token': access_token,
+        }
+        if refresh_token:
+            values['google_refresh_token'] = refresh_token
+        if token_expiry:
+            values['token_expiry'] = token_expiry
+
+        stmt = dialect_insert(User).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['telegram_id'],
+            set_={key: value for key, value in values.items() if key != 'telegram_id'}
+        )
+
+        async with self.get_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+        self._invalidate_user(telegram_id)
+
+    async def create_sync_log(self, user_id: int) -> int:
         """
         Создает новую запись в журнале синхронизации
-        
+
+        Вставка выполняется Core-выражением без unit-of-work ORM:
+        ни отслеживания состояния объекта, ни dirty-проверок — только
+        INSERT и присвоенный ID
+
         Args:
             user_id: ID пользователя в базе данных
-            
+
         Returns:
-            Созданный объект журнала синхронизации
+            ID созданной записи журнала
         """
         async with self.get_session() as session:
-            sync_log = SyncLog(user_id=user_id)
-            session.add(sync_log)
+            result = await session.execute(
+                insert(SyncLog.__table__).values(user_id=user_id)
+            )
             await session.commit()
-            await session.refresh(sync_log)
-            return sync_log
-    
-    async def update_sync_log(self, sync_log_id: int, end_time: datetime = None, 
-                            success: bool = False, total_contacts: int = 0,
-                            added_contacts: int = 0, updated_contacts: int = 0,
-                            failed_contacts: int = 0, skipped_contacts: int = 0,
-                            error_message: str = None) -> SyncLog:
+            return result.inserted_primary_key[0]
+
+    async def update_sync_log(self, sync_log_id: int, update_data: Dict[str, Any]) -> None:
         """
         Обновляет информацию о синхронизации
-        
+
+        Все переданные поля записываются одним Core-выражением UPDATE —
+        без загрузки записи в ORM и без последующего перечитывания
+
         Args:
             sync_log_id: ID записи журнала синхронизации
-            end_time: Время завершения синхронизации
-            success: Успешность синхронизации
-            total_contacts: Общее количество контактов
-            added_contacts: Количество добавленных контактов
-            updated_contacts: Количество обновленных контактов
-            failed_contacts: Количество контактов с ошибками
-            skipped_contacts: Количество пропущенных контактов
-            error_message: Сообщение об ошибке
-            
-        Returns:
-            Обновленный объект журнала синхронизации
-            
+            update_data: Словарь с обновляемыми полями записи
+                (end_time, success, счетчики контактов, error_message)
+
         Raises:
             Exception: Если запись журнала не найдена
         """
+        columns = SyncLog.__table__.columns.keys()
+        values = {key: value for key, value in update_data.items() if key in columns}
+        if not values:
+            return
+
         async with self.get_session() as session:
-            sync_log = await session.get(SyncLog, sync_log_id)
-            if not sync_log:
-                raise Exception(f"Запись синхронизации с ID {sync_log_id} не найдена")
-            
-            if end_time:
-                sync_log.end_time = end_time
-                
-            sync_log.success = success
-            sync_log.total_contacts = total_contacts
-            sync_log.added_contacts = added_contacts
-            sync_log.updated_contacts = updated_contacts
-            sync_log.failed_contacts = failed_contacts
-            sync_log.skipped_contacts = skipped_contacts
-            
-            if error_message:
-                sync_log.error_message = error_message
-                
+            result = await session.execute(
+                update(SyncLog.__table__)
+                .where(SyncLog.__table__.c.id == sync_log_id)
+                .values(**values)
+            )
             await session.commit()
-            await session.refresh(sync_log)
-            return sync_log
-    
-    async def get_contact_by_google_id(self, user_id: int, google_id: str) -> Optional[Contact]:
+
+        if not result.rowcount:
+            raise Exception(f"Запись синхронизации с ID {sync_log_id} не найдена")
+
+    async def bump_sync_log(self, sync_log_id: int, total: int = 0, added: int = 0,
+                            updated: int = 0, failed: int = 0, skipped: int = 0) -> None:
+        """
+        Атомарно увеличивает счетчики записи журнала синхронизации
+
+        Инкременты вида col = col + n выполняются одним UPDATE прямо в БД:
+        запись не загружается в ORM, а параллельные страницы синхронизации
+        не теряют чужие обновления в гонке чтение-изменение-запись
+
+        Args:
+            sync_log_id: ID записи журнала синхронизации
+            total: Прибавка к общему числу контактов
+            added: Прибавка к числу добавленных контактов
+            updated: Прибавка к числу обновленных контактов
+            failed: Прибавка к числу контактов с ошибками
+            skipped: Прибавка к числу пропущенных контактов
+        """
+        increments = {
+            "total_contacts": total,
+            "added_contacts": added,
+            "updated_contacts": updated,
+            "failed_contacts": failed,
+            "skipped_contacts": skipped
+        }
+        values = {
+            column: getattr(SyncLog, column) + amount
+            for column, amount in increments.items() if amount
+        }
+        if not values:
+            return
+
+        async with self.get_session() as session:
+            await session.execute(
+                update(SyncLog)
+                .where(SyncLog.id == sync_log_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def get_contact_by_google_id(self, user_id: int, google_id: str,
+                                       with_relations: Tuple[str, ...] = (),
+                                       session=None) -> Optional[Contact]:
         """
         Получает контакт по ID в Google
-        
+
         Args:
             user_id: ID пользователя в базе данных
             google_id: ID контакта в Google
-            
+            with_relations: Имена связей контакта (social_links, tags,
+                groups), которые нужно загрузить сразу вторым IN-запросом
+                вместо ленивых обращений по одному
+            session: Уже открытая сессия БД (опционально)
+
         Returns:
             Объект контакта или None, если не найден
         """
-        async with self.get_session() as session:
-            query = select(Contact).where(
-                and_(
-                    Contact.user_id == user_id,
-                    Contact.google_id == google_id
+        async with self._session_scope(session) as session:
+            if with_relations:
+                # Вариативный набор опций ломает кэшируемость лямбды —
+                # для загрузки связей выражение собирается обычным путем
+                query = select(Contact).where(
+                    and_(
+                        Contact.user_id == user_id,
+                        Contact.google_id == google_id
+                    )
+                ).options(
+                    *(selectinload(getattr(Contact, relation)) for relation in with_relations)
                 )
+                return await session.scalar(query)
+            return await session.scalar(
+                _CONTACT_BY_USER_AND_GOOGLE_ID, {"uid": user_id, "gid": google_id}
             )
-            result = await session.execute(query)
-            return result.scalars().first()
     
-    async def get_social_links(self, contact_id: int) -> List[SocialLink]:
+    async def get_contacts_by_google_ids(self, user_id: int, google_ids: List[str],
+                                         session=None) -> Dict[str, Contact]:
+        """
+        Получает контакты пользователя по списку Google ID одним запросом
+
+        Args:
+            user_id: ID пользователя в базе данных
+            google_ids: Список ID контактов в Google
+            session: Уже открытая сессия БД (опционально)
+
+        Returns:
+            Словарь google_id -> объект контакта
+        """
+        if not google_ids:
+            return {}
+
+        contacts_by_google_id = {}
+        async with self._session_scope(session) as session:
+            # Разбиваем список на части, чтобы не упереться в лимит
+            # числа параметров SQL-запроса
+            for start in range(0, len(google_ids), 500):
+                chunk = google_ids[start:start + 500]
+                query = select(Contact).where(
+                    and_(
+                        Contact.user_id == user_id,
+                        Contact.google_id.in_(chunk)
+                    )
+                )
+                contacts = await session.scalars(query)
+                for contact in contacts.all():
+                    contacts_by_google_id[contact.google_id] = contact
+
+        return contacts_by_google_id
+
+    async def get_existing_google_ids(self, user_id: int, session=None) -> Set[str]:
+        """
+        Возвращает множество Google ID всех контактов пользователя
+
+        Одна проекция по индексированной колонке вместо гидратации полных
+        ORM-объектов: проверка «есть ли контакт» становится O(1) поиском
+        в множестве
+
+        Args:
+            user_id: ID пользователя в базе данных
+            session: Уже открытая сессия БД (опционально)
+
+        Returns:
+            Множество google_id существующих контактов
+        """
+        async with self._session_scope(session) as session:
+            google_ids = await session.scalars(
+                select(Contact.google_id).where(
+                    and_(
+                        Contact.user_id == user_id,
+                        Contact.google_id.isnot(None)
+                    )
+                )
+            )
+            return set(google_ids.all())
+
+    async def bulk_upsert_contacts(self, user_id: int, rows: List[Dict[str, Any]]) -> None:
+        """
+        Вставляет или обновляет контакты одним INSERT ... ON CONFLICT
+
+        Конфликт определяется по уникальному индексу (user_id, google_id):
+        новые контакты вставляются, существующие обновляются — один
+        запрос и один COMMIT на пачку вместо обращения на каждый контакт
+
+        Args:
+            user_id: ID пользователя в базе данных
+            rows: Список словарей с полями контакта (включая google_id)
+        """
+        if not rows:
+            return
+
+        if self.is_sqlite:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        # Обновляем только колонки, которые реально присутствуют в строках:
+        # вызывающие без payload_hash не должны затирать его значением NULL
+        row_cols = rows[0].keys()
+        update_cols = tuple(col for col in ("name", "email", "phone", "company",
+                                            "position", "notes", "payload_hash")
+                            if col in row_cols)
+
+        async with self.get_session() as session:
+            # Пачками по 1000 строк, чтобы не упереться в лимит числа
+            # параметров SQL-запроса
+            for start in range(0, len(rows), 1000):
+                chunk = [dict(row, user_id=user_id) for row in rows[start:start + 1000]]
+                stmt = dialect_insert(Contact).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id", "google_id"],
+                    set_={col: getattr(stmt.excluded, col) for col in update_cols}
+                )
+                await session.execute(stmt)
+            await session.commit()
+
+    async def add_contacts_bulk(self, user_id: int, contacts_data: List[Dict[str, Any]]) -> List[Contact]:
+        """
+        Добавляет несколько контактов одной транзакцией
+
+        Args:
+            user_id: ID пользователя в базе данных
+            contacts_data: Список словарей с данными контактов
+
+        Returns:
+            Список созданных объектов контактов (с заполненными ID)
+        """
+        contacts = [
+            Contact(
+                user_id=user_id,
+                name=contact_data["name"],
+                email=contact_data["email"],
+                phone=contact_data["phone"],
+                google_id=contact_data["google_id"],
+                company=contact_data["company"],
+                position=contact_data["position"],
+                notes=contact_data["notes"],
+                payload_hash=contact_data.get("payload_hash")
+            )
+            for contact_data in contacts_data
+        ]
+
+        async with self.get_session() as session:
+            session.add_all(contacts)
+            await session.commit()
+            return contacts
+
+    async def add_social_links_bulk(self, links_data: List[Dict[str, Any]]) -> None:
+        """
+        Добавляет несколько социальных ссылок одной транзакцией
+
+        Args:
+            links_data: Список словарей с ключами contact_id, platform, url
+        """
+        if not links_data:
+            return
+
+        links = [
+            SocialLink(
+                contact_id=link_data["contact_id"],
+                platform=link_data["platform"],
+                url=link_data["url"]
+            )
+            for link_data in links_data
+        ]
+
+        async with self.get_session() as session:
+            session.add_all(links)
+            await session.commit()
+
+    async def update_contact(self, contact_id: int, **kwargs) -> Optional[Contact]:
+        """
+        Обновляет информацию о контакте
+
+        Args:
+            contact_id: ID контакта в базе данных
+            **kwargs: Поля для обновления
+
+        Returns:
+            Обновленный объект контакта или None, если контакт не найден
+        """
+        async with self.get_session() as session:
+            contact = await session.get(Contact, contact_id)
+            if not contact:
+                return None
+
+            for key, value in kwargs.items():
+                if hasattr(contact, key):
+                    setattr(contact, key, value)
+
+            await session.commit()
+            return contact
+
+    async def get_social_links_for_contacts(self, contact_ids: List[int],
+                                            session=None) -> Dict[int, set]:
+        """
+        Получает URL социальных ссылок сразу для нескольких контактов
+
+        Args:
+            contact_ids: Список ID контактов
+            session: Уже открытая сессия БД (опционально)
+
+        Returns:
+            Словарь contact_id -> множество URL ссылок
+        """
+        urls_by_contact: Dict[int, set] = {}
+        if not contact_ids:
+            return urls_by_contact
+
+        async with self._session_scope(session) as session:
+            # Разбиваем список на части по аналогии с get_contacts_by_google_ids
+            for start in range(0, len(contact_ids), 500):
+                chunk = contact_ids[start:start + 500]
+                query = select(SocialLink.contact_id, SocialLink.url).where(
+                    SocialLink.contact_id.in_(chunk)
+                )
+                result = await session.execute(query)
+                for contact_id, url in result.all():
+                    urls_by_contact.setdefault(contact_id, set()).add(url)
+
+        return urls_by_contact
+
+    async def get_social_links(self, contact_id: int, session=None) -> List[SocialLink]:
         """
         Получает список социальных ссылок контакта
-        
+
         Args:
             contact_id: ID контакта
-            
+            session: Уже открытая сессия БД (опционально)
+
         Returns:
             Список объектов социальных ссылок
         """
-        async with self.get_session() as session:
+        async with self._session_scope(session) as session:
             query = select(SocialLink).where(SocialLink.contact_id == contact_id)
-            result = await session.execute(query)
-            return result.scalars().all()
+            return (await session.scalars(query)).all()
@@ -8,12 +8,12 @@
 Авторы: Сергей Дышкант, Андрианов Вячеслав
 """
 
-from datetime import datetime
 from typing import List, Dict, Optional, Any, Union
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table, Text, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Index, Table, Text, Float
+from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 
 # Базовый класс для моделей SQLAlchemy
 Base = declarative_base()
@@ -40,7 +40,9 @@ class User(Base):
     __tablename__ = 'users'
     
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(Integer, unique=True, nullable=False, index=True)
+    # Идентификаторы Telegram уже превышают 2^31 — на PostgreSQL колонка
+    # обязана быть 64-битной, иначе вставка новых пользователей упадет
+    telegram_id = Column(BigInteger, unique=True, nullable=False, index=True)
     username = Column(String(64), nullable=True)
     first_name = Column(String(64), nullable=True)
     last_name = Column(String(64), nullable=True)
@@ -51,12 +53,14 @@ class User(Base):
     google_refresh_token = Column(String(255), nullable=True)
     token_expiry = Column(DateTime, nullable=True)  # Время истечения токена доступа Google OAuth
     
-    # Настройки пользователя
-    settings = Column(Text, nullable=True)  # JSON с настройками
+    # Настройки пользователя; колонка отложена (deferred) — JSON с
+    # настройками не читается ни одним горячим путем, и его не нужно
+    # тянуть из БД при каждой загрузке пользователя
+    settings = deferred(Column(Text, nullable=True))  # JSON с настройками
     
     # Дата регистрации и последнего обновления
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Связи с другими таблицами
     contacts = relationship("Contact", back_populates="user")
@@ -68,7 +72,15 @@ class User(Base):
 class Contact(Base):
     """Модель для хранения информации о контактах пользователя"""
     __tablename__ = 'contacts'
-    
+
+    # Составной уникальный индекс: поиск контакта пользователя по Google ID
+    # идет одним погружением в индекс, а дубликаты одного контакта Google
+    # у пользователя отсекаются на уровне БД; запросы только по user_id
+    # используют левый префикс того же индекса
+    __table_args__ = (
+        Index('ix_contacts_user_id_google_id', 'user_id', 'google_id', unique=True),
+    )
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     
@@ -77,9 +89,10 @@ class Contact(Base):
     phone = Column(String(64), nullable=True)
     email = Column(String(128), nullable=True)
     
-    # Идентификаторы контакта во внешних системах
-    google_id = Column(String(255), nullable=True, index=True)
-    telegram_id = Column(Integer, nullable=True, index=True)
+    # Идентификаторы контакта во внешних системах; google_id покрыт
+    # составным индексом (user_id, google_id), отдельный не нужен
+    google_id = Column(String(255), nullable=True)
+    telegram_id = Column(BigInteger, nullable=True, index=True)
     
     # Дополнительная информация
     notes = Column(Text, nullable=True)  # Заметки о контакте
@@ -91,9 +104,10 @@ class Contact(Base):
     
     # Метаданные
     last_interaction = Column(DateTime, nullable=True)  # Последнее взаимодействие
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
+    payload_hash = Column(String(16), nullable=True)  # Хэш данных контакта из Google (blake2b-8, hex)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
     # Связи с другими таблицами
     user = relationship("User", back_populates="contacts")
     social_links = relationship("SocialLink", back_populates="contact", cascade="all, delete-orphan")
@@ -109,8 +123,10 @@ class SocialLink(Base):
     __tablename__ = 'social_links'
     
     id = Column(Integer, primary_key=True)
-    contact_id = Column(Integer, ForeignKey('contacts.id'), nullable=False)
-    
+    # Внешние ключи не индексируются автоматически, а выборка ссылок
+    # всегда фильтрует по contact_id
+    contact_id = Column(Integer, ForeignKey('contacts.id'), nullable=False, index=True)
+
     # Тип соцсети (instagram, facebook, linkedin и т.д.)
     platform = Column(String(64), nullable=False)
     
@@ -119,8 +135,8 @@ class SocialLink(Base):
     username = Column(String(128), nullable=True)
     
     # Метаданные
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Связь с контактом
     contact = relationship("Contact", back_populates="social_links")
@@ -153,8 +169,8 @@ class Group(Base):
     description = Column(Text, nullable=True)
     
     # Метаданные
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Связь с контактами
     contacts = relationship("Contact", secondary=contact_groups, back_populates="groups")
@@ -171,7 +187,7 @@ class SyncLog(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     
     # Информация о синхронизации
-    start_time = Column(DateTime, default=datetime.utcnow)
+    start_time = Column(DateTime, server_default=func.now())
     end_time = Column(DateTime, nullable=True)
     success = Column(Boolean, default=False)
     
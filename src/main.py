@@ -20,6 +20,14 @@ sys.path.append(str(root_dir))
 
 from loguru import logger
 
+# uvloop (реализация цикла событий на libuv) заметно ускоряет
+# сокетный ввод-вывод; при его отсутствии остается стандартный цикл
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
+
 # Корректная форма импортов с указанием пакета src
 from src.bot.telegram_bot import TelegramBot
 from src.database.database import DatabaseManager
@@ -32,6 +40,7 @@ async def main():
     parser = argparse.ArgumentParser(description="NetWorkGPT - интеллектуальная система управления контактами")
     parser.add_argument("--config", type=str, default="configs/config.yaml", help="Путь к файлу конфигурации")
     parser.add_argument("--debug", action="store_true", help="Включить режим отладки")
+    parser.add_argument("--migrate", action="store_true", help="Создать/обновить схему базы данных перед запуском")
     args = parser.parse_args()
     
     # Загрузка конфигурации
@@ -70,19 +79,40 @@ async def main():
             password = os.environ.get("POSTGRES_PASSWORD", postgres["password"])
             db_url = f"postgresql://{postgres['user']}:{password}@{postgres['host']}:{postgres['port']}/{postgres['database']}"
         
-        # Инициализация менеджера базы данных
+        # Инициализация менеджера базы данных. Полный обход метаданных
+        # в create_all выполняется только по флагу --migrate; обычный
+        # запуск ограничивается быстрым зондом схемы. Проверка уходит
+        # фоновой задачей и перекрывается с конструированием остальных
+        # компонентов — запуск не ждет БД дольше необходимого
         db_manager = DatabaseManager(db_url)
-        await db_manager.initialize()
-        
-        logger.info("База данных успешно инициализирована")
-        
+        if args.migrate:
+            init_task = asyncio.create_task(db_manager.initialize())
+        else:
+            init_task = asyncio.create_task(db_manager.verify_schema())
+
         # Инициализация менеджера синхронизации
         sync_manager = SyncManager(config, db_manager)
-        
+
         # Запуск Telegram бота
         bot = TelegramBot(config, db_manager, sync_manager)
-        await bot.start()
-        
+
+        # К моменту первого запроса схема должна существовать
+        await init_task
+        logger.info("База данных успешно инициализирована")
+
+        try:
+            await bot.start()
+        finally:
+            # При любой остановке бота закрываем HTTP-клиенты Google
+            # (у бота и у менеджера синхронизации свои экземпляры API)
+            # и возвращаем соединения пула БД
+            await asyncio.gather(
+                bot.google_api.aclose(),
+                sync_manager.google_api.aclose(),
+                return_exceptions=True,
+            )
+            await db_manager.close()
+
     except Exception as e:
         logger.exception(f"Ошибка при запуске приложения: {e}")
         sys.exit(1)
@@ -90,9 +120,10 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        # Создание и запуска цикла событий
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
+        # asyncio.run создает цикл (политика uvloop уже установлена выше),
+        # а при завершении корректно гасит незаконченные задачи и
+        # асинхронные генераторы — в отличие от run_until_complete
+        asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Приложение остановлено пользователем")
         sys.exit(0)
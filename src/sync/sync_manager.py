@@ -9,9 +9,8 @@
 """
 
 import asyncio
-from typing import Dict, Any, Optional, List, Union
-from datetime import datetime, timedelta
-import json
+from typing import Dict, Any, Optional, List, Set, Union
+from datetime import datetime, timedelta, timezone
 
 from loguru import logger
 
@@ -21,9 +20,93 @@ from src.database.models import User, Contact, SocialLink, SyncLog
 from src.api.google_api import GoogleContactsAPI
 
 
+# Соответствие полей People API из конфигурации колонкам таблицы контактов
+_FIELD_COLUMNS = {
+    'names': ('name',),
+    'emailAddresses': ('email',),
+    'phoneNumbers': ('phone',),
+    'biographies': ('notes',),
+    'organizations': ('company', 'position'),
+    # Устаревшие имена полей из ранних примеров конфигурации
+    'name': ('name',),
+    'email': ('email',),
+    'phone': ('phone',),
+    'notes': ('notes',),
+    # Поля без колонок в таблице контактов: ссылки на соцсети
+    # синхронизируются отдельным конвейером
+    'urls': (),
+    'social_media': (),
+}
+
+# Готовые функции извлечения по набору полей: менеджеры с одинаковой
+# конфигурацией разделяют одну и ту же функцию
+_EXTRACTOR_CACHE: Dict[frozenset, Any] = {}
+
+
+def _build_extractor(sync_fields: frozenset):
+    """Собирает функцию извлечения строки контакта под настроенные поля
+
+    Контакты приходят уже нормализованными плоскими словарями
+    (GoogleContactsAPI._process_contact_data); извлекаются только
+    колонки, соответствующие полям из config['sync']['fields'].
+    Колонка name включается всегда (NOT NULL в схеме); неизвестные
+    поля игнорируются с предупреждением в логе
+
+    Args:
+        sync_fields: Набор имен полей People API из конфигурации
+
+    Returns:
+        Функция contact_data -> словарь колонок контакта
+    """
+    extractor = _EXTRACTOR_CACHE.get(sync_fields)
+    if extractor is not None:
+        return extractor
+
+    # Непонятные имена полей не отбрасываются молча: опечатка в
+    # конфигурации должна быть видна в логе, а не терять данные
+    unknown = sorted(field for field in sync_fields if field not in _FIELD_COLUMNS)
+    if unknown:
+        logger.warning("Неизвестные поля синхронизации игнорируются: {}", ", ".join(unknown))
+
+    columns = {'name'}
+    for field in sync_fields:
+        columns.update(_FIELD_COLUMNS.get(field, ()))
+    optional = tuple(col for col in ('email', 'phone', 'notes', 'company', 'position')
+                     if col in columns)
+
+    def extract(contact_data: Dict[str, Any], _optional=optional) -> Dict[str, Any]:
+        g = contact_data.get
+        row = {'name': g('name') or ''}
+        for col in _optional:
+            row[col] = g(col) or None
+        return row
+
+    _EXTRACTOR_CACHE[sync_fields] = extract
+    return extract
+
+
+def _to_naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """Приводит datetime к наивному UTC, как он хранится в базе данных
+
+    Args:
+        dt: Время с часовым поясом или None
+
+    Returns:
+        Наивное UTC-время либо None
+    """
+    if dt is None:
+        return None
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 class SyncManager:
     """Менеджер для синхронизации контактов между Telegram и Google Contacts"""
-    
+
+    # Фиксированный набор атрибутов: без словаря на экземпляр доступ к
+    # атрибутам в горячем цикле синхронизации идет по слоту, а не через
+    # поиск по хэш-таблице
+    __slots__ = ('db_manager', 'google_api', 'sync_interval', 'batch_size', 'sync_fields', '_extract')
+
     def __init__(self, config: Dict[str, Any], db_manager: DatabaseManager):
         """
         Инициализация менеджера синхронизации
@@ -32,12 +115,14 @@ class SyncManager:
             config: Конфигурация приложения
             db_manager: Менеджер базы данных
         """
-        self.config = config
         self.db_manager = db_manager
         self.google_api = GoogleContactsAPI(config)
         self.sync_interval = config['sync']['interval']  # в минутах
         self.batch_size = config['sync']['batch_size']
-        self.sync_fields = config['sync']['fields']
+        # Неизменяемый кортеж: набор полей фиксируется на время жизни менеджера
+        self.sync_fields = tuple(config['sync']['fields'])
+        # Функция извлечения собирается один раз под настроенный набор полей
+        self._extract = _build_extractor(frozenset(self.sync_fields))
     
     async def sync_contacts(self, telegram_id: int) -> Dict[str, int]:
         """
@@ -58,24 +143,52 @@ class SyncManager:
         if not user or not user.google_token:
             raise ValueError("Пользователь не авторизован в Google")
         
-        # Создаем запись о начале синхронизации
-        sync_log = await self._create_sync_log(user.id)
+        # Создаем запись о начале синхронизации; start_time проставляет
+        # сама база данных (server_default), без utcnow на каждый вызов
+        sync_log_id = await self.db_manager.create_sync_log(user.id)
         
         try:
-            # Получаем контакты из Google
-            google_contacts = await self.google_api.get_contacts(user.google_token, user.google_refresh_token)
-            
-            # Обрабатываем контакты и сохраняем в БД
-            result = await self._process_contacts(user.id, google_contacts)
-            
-            # Обновляем статус синхронизации
-            await self._update_sync_log(sync_log.id, True, result)
+            result = {"total": 0, "added": 0, "updated": 0, "skipped": 0, "failed": 0}
+
+            # Множество существующих Google ID читается один раз на всю
+            # синхронизацию, а не на каждую страницу
+            existing_ids = await self.db_manager.get_existing_google_ids(user.id)
+
+            # Конвейер страниц: пока пачка контактов пишется в БД,
+            # следующая страница уже загружается по сети — сетевое
+            # ожидание и запись перекрываются вместо выполнения подряд
+            pages = self.google_api.iter_contact_pages(user.google_token, user.google_refresh_token)
+            next_page = asyncio.create_task(anext(pages, None))
+            try:
+                while (page := await next_page) is not None:
+                    next_page = asyncio.create_task(anext(pages, None))
+                    page_result = await self._process_contacts(user.id, page, existing_ids)
+                    for key, value in page_result.items():
+                        result[key] += value
+                    # Счетчики журнала наращиваются атомарно после каждой
+                    # страницы — прогресс виден в sync_logs еще до
+                    # завершения, и частичные итоги переживают сбой
+                    await self.db_manager.bump_sync_log(
+                        sync_log_id,
+                        total=page_result["total"],
+                        added=page_result["added"],
+                        updated=page_result["updated"],
+                        failed=page_result["failed"],
+                        skipped=page_result["skipped"],
+                    )
+            finally:
+                if not next_page.done():
+                    next_page.cancel()
+
+            # Счетчики уже наращены постранично — финальная запись
+            # проставляет только успех и время завершения
+            await self._update_sync_log(sync_log_id, True)
             
             return result
             
         except Exception as e:
             logger.error(f"Ошибка при синхронизации контактов для пользователя {telegram_id}: {e}")
-            await self._update_sync_log(sync_log.id, False, error_message=str(e))
+            await self._update_sync_log(sync_log_id, False, error_message=str(e))
             raise
     
     async def exchange_auth_code(self, auth_code: str, telegram_id: int) -> Dict[str, Any]:
@@ -95,30 +208,17 @@ class SyncManager:
         try:
             # Получаем токены из Google API
             tokens = await self.google_api.get_tokens_from_code(auth_code)
-            
-            # Получаем пользователя из БД
-            user = await self.db_manager.get_user(telegram_id)
-            
-            if not user:
-                # Создаем нового пользователя, если его нет в БД
-                user_data = {
-                    'telegram_id': telegram_id,
-                    'google_token': tokens.get('access_token'),
-                    'google_refresh_token': tokens.get('refresh_token'),
-                    'token_expiry': tokens.get('expiry').isoformat() if tokens.get('expiry') else None,
-                }
-                await self.db_manager.add_user(user_data)
-                logger.info(f"Создан новый пользователь с Telegram ID {telegram_id}")
-            else:
-                # Обновляем токены пользователя, если он уже существует в БД
-                update_data = {
-                    'google_token': tokens.get('access_token'),
-                    'google_refresh_token': tokens.get('refresh_token'),
-                    'token_expiry': tokens.get('expiry').isoformat() if tokens.get('expiry') else None,
-                }
-                await self.db_manager.update_user(user.id, update_data)
-                logger.info(f"Обновлены токены для пользователя с Telegram ID {telegram_id}")
-            
+
+            # Создание нового пользователя и обновление существующего —
+            # один UPSERT вместо чтения с последующей записью
+            await self.db_manager.upsert_user_tokens(
+                telegram_id,
+                tokens.get('access_token'),
+                refresh_token=tokens.get('refresh_token') or None,
+                token_expiry=_to_naive_utc(tokens.get('expiry')),
+            )
+            logger.info(f"Сохранены токены Google для пользователя с Telegram ID {telegram_id}")
+
             return {
                 'success': True,
                 'message': "Авторизация успешна завершена",
@@ -157,12 +257,12 @@ class SyncManager:
             tokens = await self.google_api.refresh_access_token(user.google_refresh_token)
             
             # Обновляем токены в БД
-            update_data = {
-                'google_token': tokens.get('access_token'),
-                'token_expiry': tokens.get('expiry').isoformat() if tokens.get('expiry') else None,
-            }
-            await self.db_manager.update_user(user.id, update_data)
-            
+            await self.db_manager.update_google_tokens(
+                telegram_id,
+                tokens.get('access_token'),
+                token_expiry=_to_naive_utc(tokens.get('expiry')),
+            )
+
             logger.info(f"Токены для пользователя {telegram_id} успешно обновлены")
             return True
             
@@ -170,27 +270,14 @@ class SyncManager:
             logger.error(f"Ошибка при обновлении токенов: {e}")
             return False
     
-    async def _create_sync_log(self, user_id: int) -> SyncLog:
-        """
-        Создает запись о начале синхронизации в логе
-        
-        Args:
-            user_id: ID пользователя в БД
-            
-        Returns:
-            Объект SyncLog
-        """
-        sync_log_data = {
-            'user_id': user_id,
-            'status': 'in_progress',
-            'start_time': datetime.utcnow().isoformat(),
-        }
-        return await self.db_manager.add_sync_log(sync_log_data)
-        
     async def _update_sync_log(self, sync_log_id: int, success: bool, result: Dict[str, int] = None, error_message: str = None) -> None:
         """
         Обновляет запись о синхронизации в логе
-        
+
+        Счетчики результата пишутся в целочисленные колонки sync_logs,
+        а не сериализуются в строку; время завершения — одно наивное
+        UTC-значение на синхронизацию
+
         Args:
             sync_log_id: ID записи в логе
             success: Успешность синхронизации
@@ -198,26 +285,39 @@ class SyncManager:
             error_message: Сообщение об ошибке (опционально)
         """
         update_data = {
-            'status': 'completed' if success else 'failed',
-            'end_time': datetime.utcnow().isoformat(),
+            'success': success,
+            'end_time': datetime.now(timezone.utc).replace(tzinfo=None),
         }
-        
+
         if result:
-            update_data['result'] = json.dumps(result)
-            
+            update_data.update(
+                total_contacts=result.get('total', 0),
+                added_contacts=result.get('added', 0),
+                updated_contacts=result.get('updated', 0),
+                failed_contacts=result.get('failed', 0),
+                skipped_contacts=result.get('skipped', 0),
+            )
+
         if error_message:
             update_data['error_message'] = error_message
-            
+
         await self.db_manager.update_sync_log(sync_log_id, update_data)
 
-    async def _process_contacts(self, user_id: int, google_contacts: List[Dict[str, Any]]) -> Dict[str, int]:
+    async def _process_contacts(self, user_id: int, google_contacts: List[Dict[str, Any]],
+                                existing_ids: Set[str]) -> Dict[str, int]:
         """
-        Обрабатывает контакты из Google и сохраняет их в БД
-        
+        Обрабатывает страницу контактов из Google и сохраняет их в БД
+        одним пакетным запросом
+
+        Вместо обращения к БД на каждый контакт собирается список строк,
+        который записывается одним INSERT ... ON CONFLICT DO UPDATE:
+        конфликты по (user_id, google_id) разрешает сама база данных
+
         Args:
             user_id: ID пользователя в БД
-            google_contacts: Список контактов из Google
-            
+            google_contacts: Страница контактов из Google
+            existing_ids: Google ID уже существующих контактов пользователя
+
         Returns:
             Словарь с результатами обработки контактов
         """
@@ -229,107 +329,46 @@ class SyncManager:
             "skipped": 0,
             "failed": 0
         }
-        
-        # Получаем существующие контакты пользователя из БД
-        existing_contacts = await self.db_manager.get_contacts_by_user_id(user_id)
-        
-        # Создаем словарь для быстрого доступа к существующим контактам по google_id
-        existing_by_google_id = {contact.google_id: contact for contact in existing_contacts if contact.google_id}
-        
-        # Обрабатываем каждый контакт из Google
+
+        # Собираем строки для пакетной записи; ошибки отдельных строк
+        # копятся в список и логируются одной сводкой после цикла —
+        # форматирование и запись в лог не выполняются на каждую строку
+        rows = []
+        errors = []
         for contact_data in google_contacts:
             try:
-                google_id = contact_data.get('resourceName') or contact_data.get('id')
-                
+                google_id = contact_data.get('google_id') or contact_data.get('resourceName')
+
                 if not google_id:
-                    logger.warning(f"Пропускаем контакт без ID: {contact_data}")
                     result["skipped"] += 1
                     continue
-                
+
                 # Извлекаем необходимую информацию из контакта
-                contact_info = self._extract_contact_info(contact_data)
-                
-                # Проверяем, существует ли контакт в БД
-                if google_id in existing_by_google_id:
-                    # Обновляем существующий контакт
-                    existing_contact = existing_by_google_id[google_id]
-                    await self.db_manager.update_contact(existing_contact.id, contact_info)
-                    result["updated"] += 1
-                else:
-                    # Добавляем новый контакт
-                    contact_info['user_id'] = user_id
-                    contact_info['google_id'] = google_id
-                    await self.db_manager.add_contact(contact_info)
-                    result["added"] += 1
-                    
+                contact_info = self._extract(contact_data)
+                contact_info['google_id'] = google_id
+                rows.append(contact_info)
+
             except Exception as e:
-                logger.error(f"Ошибка при обработке контакта: {e}")
+                errors.append(str(e)[:120])
                 result["failed"] += 1
-        
-        return result
-    
-    def _extract_contact_info(self, contact_data: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Извлекает необходимую информацию из контакта Google
-        
-        Args:
-            contact_data: Данные контакта из Google API
-            
-        Returns:
-            Словарь с извлеченной информацией
-        """
-        # Инициализируем словарь для хранения извлеченной информации
-        result = {
-            'name': '',
-            'email': None,
-            'phone': None,
-            'notes': None,
-            'company': None,
-            'position': None,
-        }
-        
-        # Извлекаем имя контакта
-        names = contact_data.get('names', [])
-        if names and len(names) > 0:
-            name_info = names[0]
-            full_name = name_info.get('displayName')
-            if full_name:
-                result['name'] = full_name
-        
-        # Извлекаем email контакта
-        emails = contact_data.get('emailAddresses', [])
-        if emails and len(emails) > 0:
-            email_info = emails[0]
-            email = email_info.get('value')
-            if email:
-                result['email'] = email
-        
-        # Извлекаем телефон контакта
-        phones = contact_data.get('phoneNumbers', [])
-        if phones and len(phones) > 0:
-            phone_info = phones[0]
-            phone = phone_info.get('value')
-            if phone:
-                result['phone'] = phone
-        
-        # Извлекаем заметки контакта
-        biographies = contact_data.get('biographies', [])
-        if biographies and len(biographies) > 0:
-            bio_info = biographies[0]
-            notes = bio_info.get('value')
-            if notes:
-                result['notes'] = notes
-        
-        # Извлекаем компанию и должность контакта
-        organizations = contact_data.get('organizations', [])
-        if organizations and len(organizations) > 0:
-            org_info = organizations[0]
-            company = org_info.get('name')
-            position = org_info.get('title')
-            
-            if company:
-                result['company'] = company
-            if position:
-                result['position'] = position
-        
+
+        if result["skipped"]:
+            logger.warning("Пропущено контактов без Google ID: {}", result["skipped"])
+        if errors:
+            logger.error("Ошибок при обработке контактов: {}, первая: {}", len(errors), errors[0])
+            # Полный список ошибок — только если включен уровень DEBUG
+            logger.opt(lazy=True).debug("Все ошибки обработки: {}", lambda: "; ".join(errors))
+
+        if not rows:
+            return result
+
+        # Одна пакетная запись вместо обращения к БД на каждый контакт
+        await self.db_manager.bulk_upsert_contacts(user_id, rows)
+
+        for row in rows:
+            if row['google_id'] in existing_ids:
+                result["updated"] += 1
+            else:
+                result["added"] += 1
+
         return result
@@ -1,96 +0,0 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-Methods for managing synchronization of NetWorkGPT
-Implements the necessary functions for SyncManager
-
-Authors: Sergey Dashkov, Andrey Vocheslav
-"""
-
-import asyncio
-from typing import Dict, Any, Optional, List, Union
-from datetime import datetime, timedelta
-import json
-
-from loguru import logger
-
-from src.database.models import User, Contact, SocialLink, SyncLog
-
-
-async def _create_sync_log(db_manager, user_id: int) -> SyncLog:
-    """Creates a log entry for the start of synchronization
-    
-    Args:
-        db_manager: Database manager
-        user_id: ID of the user in the database
-        
-    Returns:
-        Created SyncLog object
-    """
-    async with db_manager.get_session() as session:
-        sync_log = SyncLog(
-            user_id=user_id,
-            start_time=datetime.utcnow(),
-            success=False
-        )
-        session.add(sync_log)
-        await session.commit()
-        await session.refresh(sync_log)
-        return sync_log
-
-
-async def _update_sync_log(db_manager, log_id: int, success: bool, 
-                         stats: Optional[Dict[str, int]] = None, 
-                         error_message: Optional[str] = None) -> None:
-    """Updates the log entry for the end of synchronization
-    
-    Args:
-        db_manager: Database manager
-        log_id: ID of the log entry in the database
-        success: Whether the synchronization was successful
-        stats: Statistics of the synchronization
-        error_message: Error message if the synchronization failed
-    """
-    async with db_manager.get_session() as session:
-        result = await session.get(SyncLog, log_id)
-        if result:
-            result.end_time = datetime.utcnow()
-            result.success = success
-            
-            if stats:
-                result.total_contacts = stats.get('total', 0)
-                result.added_contacts = stats.get('added', 0)
-                result.updated_contacts = stats.get('updated', 0)
-                result.skipped_contacts = stats.get('skipped', 0)
-            
-            if error_message:
-                result.error_message = error_message
-                
-            await session.commit()
-
-
-async def _process_contacts(db_manager, user_id: int, google_contacts: List[Dict[str, Any]]) -> Dict[str, int]:
-    """Processes contacts from Google and synchronizes them with the database
-    
-    Args:
-        db_manager: Database manager
-        user_id: ID of the user in the database
-        google_contacts: List of contacts from Google
-        
-    Returns:
-        Statistics of the synchronization
-    """
-    stats = {'total': len(google_contacts), 'added': 0, 'updated': 0, 'skipped': 0}
-    
-    # Here will be implemented the code for synchronization of contacts
-    # In the MVP version, we will simply return dummy data
-    
-    stats['added'] = 15
-    stats['updated'] = 5
-    stats['skipped'] = len(google_contacts) - 20
-    
-    return stats
-
-
-# Additional functionality will be added in the future versions